@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+import argparse, asyncio, math, os, signal, subprocess, sys, threading, time
+from pathlib import Path
+
+import previews
+
+# Library API: `await generate_previews(input, outdir, **options)` runs the preview
+# pipeline as concurrent stages on the caller's event loop. ffmpeg decodes into an
+# asyncio pipe, full sheets go through a bounded queue to encoders on an executor (sheet N
+# is encoded while ffmpeg is still decoding sheet N+1), and placing the video, the web
+# video, packaging, the cue files and the poster run alongside. The files written are
+# the same as main_file.py --pipe, so both share cache entries.
+
+class OptionError(argparse.ArgumentParser):
+    # add_preview_args() parser that raises ValueError instead of exiting
+    def error(self, message):
+        raise ValueError(message)
+
+def preview_args(inp, outdir, **options):
+    # The namespace previews.generate() gets from its CLI; options are the argparse
+    # dest names (tile_size="160x90", encode_workers=4, ...)
+    ap = OptionError()
+    previews.add_preview_args(ap)
+    args = ap.parse_args([])
+    unknown = set(options) - set(vars(args))
+    if unknown:
+        raise TypeError(f"unknown option(s): {', '.join(sorted(unknown))}")
+    vars(args).update(options)
+    args.input, args.outdir = str(inp), str(outdir)
+    args.pipe = True
+    previews.check_preview_args(ap, args)
+    unsupported = [name for name, on in (
+        ("extract", args.extract != "fps"), ("jobs", args.jobs > 1), ("engine", args.engine != "pil"),
+        ("adaptive", args.adaptive), ("dedup", args.dedup), ("incremental", args.incremental),
+        ("several tile sizes", len(previews.parse_sizes(args.tile_size)) > 1)) if on]
+    if unsupported:
+        raise ValueError(f"not supported by the async pipeline (use previews.generate): {', '.join(unsupported)}")
+    return args
+
+async def in_thread(metrics, stage, cancel, fn, *fn_args):
+    # Blocking step on the loop's default executor; every run() inside it stops its
+    # ffmpeg when `cancel` is set. The step gets a span under `stage` when one is given.
+    def call():
+        previews.cancel_scope.event = cancel
+        started, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return fn(*fn_args)
+        finally:
+            previews.cancel_scope.event = None
+            if stage:
+                metrics.add(stage, time.perf_counter() - started, time.thread_time() - cpu)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+async def decode_sheets(cmd, tile_w, tile_h, per_sheet, sheets):
+    # Producer: rgb24 frames from ffmpeg, grouped per sheet into the `sheets` queue.
+    # put() waits while the encoders are behind, and ffmpeg then blocks on the full pipe.
+    # Returns the number of frames decoded.
+    from PIL import Image
+    frame_size = tile_w * tile_h * 3
+    group = {"start_new_session": True} if os.name != "nt" else {}
+    proc = await asyncio.create_subprocess_exec(*cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE, **group)
+    tail = previews.OutputTail()
+
+    async def drain():
+        while True:
+            chunk = await proc.stderr.read(1 << 16)
+            if not chunk:
+                return
+            tail.append(chunk)
+
+    drainer = asyncio.create_task(drain())
+    frames, sheet_idx, chunk = 0, 0, []
+    try:
+        while True:
+            try:
+                data = await proc.stdout.readexactly(frame_size)
+            except asyncio.IncompleteReadError as e:
+                if e.partial:
+                    raise RuntimeError(f"Truncated frame from ffmpeg ({len(e.partial)} of {frame_size} bytes)")
+                break
+            chunk.append(Image.frombuffer("RGB", (tile_w, tile_h), data, "raw", "RGB", 0, 1))
+            frames += 1
+            if len(chunk) == per_sheet:
+                await sheets.put((sheet_idx, chunk))
+                sheet_idx, chunk = sheet_idx + 1, []
+        if chunk:
+            await sheets.put((sheet_idx, chunk))
+        await proc.wait()
+    finally:
+        if proc.returncode is None:
+            try:
+                if group:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                else:
+                    proc.kill()
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+        await drainer
+    if proc.returncode != 0:
+        raise RuntimeError(f"Command failed:\n{' '.join(cmd)}\nSTDERR:\n{tail.text()}")
+    return frames
+
+async def encode_sheets(writer, sheets, executor, written):
+    # Consumer: compose and encode each sheet on the executor until a None arrives
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await sheets.get()
+        if item is None:
+            return
+        sheet_idx, chunk = item
+        name, n, seconds = await loop.run_in_executor(executor, writer.build, sheet_idx, chunk, 0)
+        written[sheet_idx] = name
+        writer.encode_seconds += seconds
+        print(f"  wrote {name} ({n} tiles)")
+
+def write_cues(outdir, sprite_pattern, total_frames, interval, duration, cols, per_sheet, tile_w, tile_h):
+    # Uniform cues only depend on the probe, so they are written while sprites are made
+    rows = lambda: previews.uniform_cue_rows(0, total_frames, interval, duration, cols, per_sheet, tile_w, tile_h)
+    previews.write_vtt(outdir / "thumbnails.vtt", rows(), sprite_pattern, tile_w, tile_h)
+    previews.write_cue_index(outdir / "thumbnails.idx", rows(), sprite_pattern, tile_w, tile_h)
+    return ["thumbnails.vtt", "thumbnails.idx"]
+
+async def generate_previews(inp, outdir, executor=None, **options):
+    # Async counterpart of previews.generate(); returns the same stats dict. Sheets are
+    # encoded on `executor` (the loop's default when None), e.g. a pool shared by every
+    # job on the loop to cap CPU use. Cancelling the await stops all of its ffmpeg children.
+    args = preview_args(inp, outdir, **options)
+    inp = Path(args.input).resolve()
+    outdir = Path(args.outdir).resolve()
+    outdir.mkdir(parents=True, exist_ok=True)
+    metrics = previews.Metrics(args.metrics_jsonl, input=inp.name)
+    cancel = threading.Event()
+    tasks = []
+
+    def finish(stats):
+        stats.update(timings=metrics.timings(), spans=metrics.spans)
+        metrics.event("run", **{k: v for k, v in stats.items() if k not in ("timings", "spans")})
+        if args.metrics_prom:
+            previews.write_prom(args.metrics_prom, metrics, stats)
+        return stats
+
+    def background(coro):
+        task = asyncio.ensure_future(coro)
+        tasks.append(task)
+        return task
+
+    try:
+        web = args.web_video != "off"
+        video_filename = f"{inp.stem}.mp4" if web else inp.name
+        if web and outdir / video_filename == inp:
+            video_filename = f"{inp.stem}_web.mp4"
+        video_dest = outdir / video_filename
+        placer = None
+        if not web:
+            placer = background(in_thread(metrics, "copy", cancel, previews.place_video, inp, video_dest, args.link_mode))
+
+        cache_dir = Path(args.cache_dir).expanduser().resolve() if args.cache_dir else None
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            key = await in_thread(metrics, None, cancel, previews.cache_key, inp, args)
+            files = previews.cache_lookup(cache_dir, key)
+            if files is not None:
+                await in_thread(metrics, "cache", cancel, previews.cache_restore, cache_dir, key, files, outdir)
+                print(f"Cache hit ({key}): restored {len(files)} files.")
+                print(f"Placed {video_filename} ({await placer if placer else 'cached'})")
+                return finish({"frames": 0, "sheets": sum(f.startswith("sprite_") for f in files), "duration": None,
+                               "cached": True})
+
+        (tile_w, tile_h), = previews.parse_sizes(args.tile_size)
+        media = await in_thread(metrics, "probe", cancel, previews.probe_media, inp)
+        duration = media.duration
+        interval = float(args.interval)
+        total_frames = int(math.ceil(duration / interval))
+        print(f"Duration: {duration:.3f}s | {media.video_codec} {media.width}x{media.height} @ {media.fps:.3f}fps | "
+              f"interval={interval}s -> {total_frames} frames | grid={args.tile.lower()}")
+
+        fmt, quality = args.format, args.quality
+        if "auto" in (args.tile.lower(), fmt, quality):
+            print("Planning sprite sheets from sample tiles...")
+            plan = await in_thread(metrics, "plan", cancel, previews.plan_sprites, inp, duration, total_frames,
+                                   tile_w, tile_h, fmt, quality, args.tile, args.ssim, args.sheet_bytes)
+            cols, rows, fmt, quality = plan["cols"], plan["rows"], plan["format"], plan["quality"]
+            print(f"  grid={cols}x{rows} format={fmt} quality={quality or 'default'} | "
+                  f"sample SSIM {plan['ssim']:.3f}, ~{plan['tile_bytes'] * cols * rows / 1024:.0f} KiB per full sheet")
+        else:
+            cols, rows = map(int, args.tile.lower().split("x"))
+        per_sheet = cols * rows
+        sprite_pattern = f"sprite_%d.{fmt}"
+
+        if web:
+            print(f"Writing {video_filename} for the web ({args.web_video}) in the background...")
+            placer = background(in_thread(metrics, "web_video", cancel, previews.web_video, inp, video_dest, media,
+                                          args.web_video, args.target_width, args.bitrate,
+                                          previews.Progress(video_filename, duration, metrics, every=10.0)))
+        packager = None
+        if args.hls or args.dash:
+            async def package():
+                if web:
+                    await placer
+                return await in_thread(metrics, "package", cancel, previews.package_video,
+                                       video_dest if web else inp, outdir, args.hls, args.dash, args.segment)
+            print("Packaging " + " and ".join(n for n, on in (("HLS", args.hls), ("DASH", args.dash)) if on)
+                  + " in the background...")
+            packager = background(package())
+        cues = background(in_thread(metrics, "vtt", cancel, write_cues, outdir, sprite_pattern, total_frames,
+                                    interval, duration, cols, per_sheet, tile_w, tile_h))
+        poster_dest = outdir / "thumbnail.jpg"
+        poster = None
+        if args.poster == "seek":
+            poster = background(in_thread(metrics, "poster", cancel, previews.extract_poster, inp, duration / 2, poster_dest))
+
+        # Decode -> bounded queue -> encoders; at most `workers` sheets wait in the queue
+        print("Streaming frames from ffmpeg into sprite sheets...")
+        workers = max(1, args.encode_workers)
+        sheets = asyncio.Queue(maxsize=workers)
+        writer = previews.SpriteWriter(outdir, cols, rows, tile_w, tile_h, fmt, quality=quality)
+        written = {}
+        assemble_started = time.perf_counter()
+        encoders = [background(encode_sheets(writer, sheets, executor, written)) for _ in range(workers)]
+        frames = await background(decode_sheets(previews.raw_frames_cmd(inp, interval, tile_w, tile_h),
+                                                tile_w, tile_h, per_sheet, sheets))
+        for _ in encoders:
+            await sheets.put(None)
+        await asyncio.gather(*encoders)
+        sprite_files = [written[i] for i in sorted(written)]
+        elapsed = time.perf_counter() - assemble_started
+        metrics.add("assemble", elapsed)
+        metrics.add("encode", writer.encode_seconds)
+        if not sprite_files:
+            raise RuntimeError(f"No frames extracted from {inp}")
+        print(f"  {frames} frames -> {len(sprite_files)} sheets in {elapsed:.2f}s ({workers} encoder(s))")
+
+        if poster is None:
+            def poster_from_tile():
+                sample_times = [(idx * interval + min(duration, (idx + 1) * interval)) / 2 for idx in range(total_frames)]
+                idx, t = previews.pick_poster_tile(outdir, sprite_files, sample_times, duration, cols, per_sheet,
+                                                    tile_w, tile_h, max(1, args.poster_candidates))
+                print(f"  using tile {idx} at {t:.3f}s")
+                previews.extract_poster(inp, t, poster_dest)
+            poster = background(in_thread(metrics, "poster", cancel, poster_from_tile))
+
+        cue_files = await cues
+        print("Wrote thumbnails.vtt and thumbnails.idx")
+        await poster
+        print("Wrote thumbnail.jpg")
+        placed = await placer
+        print(f"Placed {video_filename} ({placed})")
+        packaged = await packager if packager is not None else []
+
+        if cache_dir is not None:
+            files = sprite_files + cue_files + ["thumbnail.jpg"] + ([video_filename] if web else []) + packaged
+            await in_thread(metrics, "cache", cancel, previews.cache_store, cache_dir, key, files, outdir)
+            previews.cache_evict(cache_dir, args.cache_max_bytes)
+    except BaseException:
+        # Failure or cancellation: stop every ffmpeg this job started and wind down its tasks
+        cancel.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    print("\nDone. Generated sprite sheets, WebVTT, and thumbnail.")
+    return finish({"frames": total_frames, "sheets": len(sprite_files), "duration": duration, "cached": False})
+
+async def generate_all(videos, concurrency, **options):
+    # Several (input, outdir) videos on one loop, at most `concurrency` at a time; a failed
+    # video is reported and does not stop the others
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(inp, outdir):
+        async with gate:
+            try:
+                return await generate_previews(inp, outdir, **options)
+            except (RuntimeError, OSError) as e:
+                print(f"{inp}: FAILED {e}", file=sys.stderr)
+                return None
+
+    return await asyncio.gather(*(one(inp, outdir) for inp, outdir in videos))
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate previews for one or more videos concurrently on one event loop.")
+    ap.add_argument("pairs", nargs="+", metavar="INPUT OUTDIR", help="Input video and output directory, repeated")
+    ap.add_argument("--concurrency", type=int, default=4, help="Videos processed at the same time (default: 4)")
+    previews.add_preview_args(ap)
+    args = ap.parse_args()
+    if len(args.pairs) % 2:
+        ap.error("expected INPUT OUTDIR pairs")
+    options = {k: v for k, v in vars(args).items() if k not in ("pairs", "concurrency")}
+    videos = list(zip(args.pairs[::2], args.pairs[1::2]))
+    try:
+        for inp, outdir in videos:
+            preview_args(inp, outdir, **options)
+    except ValueError as e:
+        ap.error(str(e))
+    results = asyncio.run(generate_all(videos, max(1, args.concurrency), **options))
+    if any(r is None for r in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import argparse, contextvars, glob, json, sys, time, traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import previews
+
+VIDEO_EXTS = {".mp4", ".mkv", ".mov", ".avi", ".ts", ".m4v", ".webm"}
+
+job_log = contextvars.ContextVar("job_log", default=None)
+
+class JobStdout:
+    # Route print() from each job to its own log file: job_log is set on the job's
+    # thread, and generate() hands it to the threads it starts (progress drainers,
+    # placer, packager, worker pools) through previews.in_context()
+    def __init__(self, default):
+        self.default = default
+
+    def write(self, s):
+        return (job_log.get() or self.default).write(s)
+
+    def flush(self):
+        (job_log.get() or self.default).flush()
+
+def collect_inputs(source, pattern):
+    # Directory (recursive, by extension or --pattern), glob, or manifest file.
+    # Manifests are JSON lists of paths / {"input", "outdir"} objects, or text with one
+    # path per line (optionally "path<TAB>outdir"). Returns [(input, outdir-or-None,
+    # name)], name being the input's path relative to a source directory, else its file name.
+    src = Path(source)
+    if src.is_dir():
+        if pattern:
+            paths = sorted(src.rglob(pattern))
+        else:
+            paths = sorted(p for p in src.rglob("*") if p.suffix.lower() in VIDEO_EXTS)
+        return [(p, None, p.relative_to(src)) for p in paths if p.is_file()]
+    if src.is_file() and src.suffix.lower() not in VIDEO_EXTS:
+        jobs = []
+        if src.suffix.lower() == ".json":
+            for item in json.loads(src.read_text(encoding="utf-8")):
+                if isinstance(item, str):
+                    jobs.append((Path(item), None))
+                else:
+                    jobs.append((Path(item["input"]), item.get("outdir")))
+        else:
+            for line in src.read_text(encoding="utf-8").splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                path, _, outdir = line.partition("\t")
+                jobs.append((Path(path), outdir or None))
+        return [(p if p.is_absolute() else src.parent / p, o, Path(p.name)) for p, o in jobs]
+    if src.is_file():
+        return [(src, None, Path(src.name))]
+    return [(Path(p), None, Path(Path(p).name)) for p in sorted(glob.glob(source, recursive=True))]
+
+def assign_outdirs(outroot, inputs):
+    # outroot/<manifest outdir>, else outroot/<name without its extension>. Inputs whose
+    # names only differ in the extension keep it (a.mp4 -> a.mp4/, a.mkv -> a.mkv/) so
+    # two workers never share a directory; any clash left raises ValueError.
+    stems = Counter(name.with_suffix("") for _, outdir, name in inputs if outdir is None)
+    jobs, owners = [], {}
+    for inp, outdir, name in inputs:
+        if outdir is None:
+            outdir = name.with_suffix("") if stems[name.with_suffix("")] == 1 else name
+        path = (outroot / outdir).resolve()
+        if path in owners:
+            raise ValueError(f"{owners[path]} and {inp} would both write to {path}")
+        owners[path] = inp
+        jobs.append((inp.resolve(), path))
+    return jobs
+
+def run_job(args, inp, outdir, retries, backoff):
+    # One video: its own outdir and log; ffmpeg failures are retried with backoff,
+    # anything else fails the job without affecting the others
+    outdir.mkdir(parents=True, exist_ok=True)
+    job_args = argparse.Namespace(**vars(args))
+    job_args.input, job_args.outdir = str(inp), str(outdir)
+    started = time.perf_counter()
+    with open(outdir / "preview.log", "a", encoding="utf-8") as log:
+        token = job_log.set(log)
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    stats = previews.generate(job_args)
+                    break
+                except (RuntimeError, OSError) as e:
+                    log.write(f"attempt {attempt + 1} failed: {e}\n")
+                    if attempt == retries:
+                        raise
+                    time.sleep(backoff * 2 ** attempt)
+                except SystemExit as e:
+                    raise RuntimeError(f"aborted ({e.code})")
+        finally:
+            job_log.reset(token)
+    stats["attempts"] = attempt + 1
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate hover/scrub previews for many videos in one process.")
+    ap.add_argument("source", help="Directory, glob (quote it), or manifest file (.txt/.json)")
+    ap.add_argument("outroot", help="Output root; each video gets its own subdirectory")
+    ap.add_argument("--pattern", help="Filename glob when source is a directory (default: common video extensions)")
+    ap.add_argument("--workers", type=int, default=2, help="Videos processed concurrently (default: 2)")
+    ap.add_argument("--retries", type=int, default=2, help="Retries per video for failed ffmpeg runs (default: 2)")
+    ap.add_argument("--retry-backoff", type=float, default=2.0, help="Seconds before the first retry, doubled after each (default: 2.0)")
+    previews.add_preview_args(ap)
+    args = ap.parse_args()
+    previews.check_preview_args(ap, args)
+
+    try:
+        jobs = assign_outdirs(Path(args.outroot).resolve(), collect_inputs(args.source, args.pattern))
+    except ValueError as e:
+        ap.error(str(e))
+    if not jobs:
+        print("No input videos found.")
+        sys.exit(1)
+    job_args = {k: v for k, v in vars(args).items()
+                if k not in ("source", "outroot", "pattern", "workers", "retries", "retry_backoff")}
+    print(f"{len(jobs)} videos, {args.workers} workers")
+
+    sys.stdout = JobStdout(sys.stdout)
+    done, failed, frames, media_seconds = 0, [], 0, 0.0
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = {
+                pool.submit(run_job, argparse.Namespace(**job_args), inp, outdir, args.retries, args.retry_backoff): (inp, outdir)
+                for inp, outdir in jobs
+            }
+            for fut in as_completed(futures):
+                inp, outdir = futures[fut]
+                try:
+                    stats = fut.result()
+                except Exception as e:
+                    failed.append((inp, e))
+                    print(f"  FAILED {inp.name}: {str(e).splitlines()[0] if str(e) else type(e).__name__} "
+                          f"(see {outdir / 'preview.log'})")
+                    with open(outdir / "preview.log", "a", encoding="utf-8") as log:
+                        traceback.print_exception(e, file=log)
+                    continue
+                done += 1
+                frames += stats["frames"]
+                media_seconds += stats["duration"] or 0.0
+                note = "cache hit" if stats["cached"] else f"{stats['frames']} frames, {stats['sheets']} sheets"
+                retry = f", {stats['attempts']} attempts" if stats["attempts"] > 1 else ""
+                print(f"  [{done + len(failed)}/{len(jobs)}] {inp.name}: {note} in {stats['seconds']:.1f}s{retry}")
+    finally:
+        sys.stdout = sys.stdout.default
+
+    elapsed = time.perf_counter() - started
+    print(f"\nDone: {done} ok, {len(failed)} failed in {elapsed:.1f}s | "
+          f"{done / elapsed * 60:.1f} videos/min, {frames / elapsed:.1f} frames/s, "
+          f"{media_seconds / 3600:.2f}h of video")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
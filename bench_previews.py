@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+import argparse, contextlib, io, itertools, json, os, platform, resource, statistics, sys, tempfile, time
+from pathlib import Path
+
+import previews
+
+# Preview pipeline benchmark on deterministic synthetic inputs. Every case runs in a
+# fresh child process so peak RSS (ours and the ffmpeg children's) is per case;
+# results go to a JSON file that --compare checks against an earlier run.
+
+MODES = {
+    "fps": [],
+    "pipe": ["--pipe"],
+    "seek": ["--extract", "seek"],
+    "keyframe": ["--extract", "keyframe"],
+    "jobs4": ["--jobs", "4"],
+    "ffmpeg-tile": ["--engine", "ffmpeg-tile"],
+    "workers4": ["--encode-workers", "4"],
+    "dedup": ["--dedup"],
+    "adaptive": ["--adaptive"],
+}
+
+def make_input(work, source, size, duration, fps=25):
+    # Encoded once and reused; bitexact flags and a single x264 thread keep it byte-stable
+    path = work / f"{source}_{size}_{duration:g}s.mp4"
+    if path.exists():
+        return path
+    lavfi = {
+        "testsrc2": f"testsrc2=size={size}:rate={fps}:duration={duration}",
+        "mandelbrot": f"mandelbrot=size={size}:rate={fps},trim=duration={duration}",
+    }[source]
+    tmp = path.with_name(path.name + ".tmp.mp4")
+    print(f"Generating {path.name}...")
+    previews.run([
+        "ffmpeg", "-y", "-v", "error", "-f", "lavfi", "-i", lavfi,
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(2 * fps), "-pix_fmt", "yuv420p", "-threads", "1",
+        "-c:a", "aac", "-b:a", "96k", "-shortest",
+        "-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact", str(tmp)
+    ])
+    os.replace(tmp, path)
+    return path
+
+def run_case(case):
+    # Child side: one generate() call with stdout silenced; prints a JSON result line
+    ap = argparse.ArgumentParser()
+    previews.add_preview_args(ap)
+    args = ap.parse_args(case["argv"])
+    args.input, args.outdir = case["input"], case["outdir"]
+    previews.check_preview_args(ap, args)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = previews.generate(args)
+    wall = time.perf_counter() - started
+    outdir = Path(case["outdir"])
+    out_bytes = sum(f.stat().st_size for f in outdir.rglob("*")
+                    if f.is_file() and f.parent.name != "frames" and f.name != Path(case["input"]).name)
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({
+        "wall": wall, "stages": stats["timings"], "frames": stats["frames"], "sheets": stats["sheets"],
+        "output_bytes": out_bytes,
+        # ru_maxrss is KiB on Linux, bytes on macOS. The children figure is the largest
+        # ffmpeg/ffprobe, but never below the interpreter size they were forked from.
+        "peak_rss_mb": self_rss / (1 << 20 if sys.platform == "darwin" else 1 << 10),
+        "children_peak_rss_mb": child_rss / (1 << 20 if sys.platform == "darwin" else 1 << 10),
+    }))
+
+def bench(case, repeat, timeout=None):
+    # Median over repeats of each timing; max of the peaks
+    runs = []
+    for _ in range(repeat):
+        try:
+            out = previews.run([sys.executable, __file__, "--run-case", json.dumps(case)], timeout=timeout)
+        except RuntimeError as e:
+            lines = str(e).strip().splitlines()
+            return {"error": lines[-1] if lines[-1] != "STDERR:" else lines[0].rstrip(":")}
+        runs.append(json.loads(out.splitlines()[-1]))
+    stages = sorted({k for r in runs for k in r["stages"]})
+    return {
+        "wall": statistics.median(r["wall"] for r in runs),
+        "stages": {k: statistics.median(r["stages"].get(k, 0.0) for r in runs) for k in stages},
+        "frames": runs[0]["frames"], "sheets": runs[0]["sheets"], "output_bytes": runs[0]["output_bytes"],
+        "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+        "children_peak_rss_mb": max(r["children_peak_rss_mb"] for r in runs),
+    }
+
+def case_id(case):
+    return " ".join(f"{k}={case[k]}" for k in ("source", "size", "duration", "mode", "interval", "tile", "tile_size", "format"))
+
+def compare(old_path, results, tolerance):
+    # Per case: wall time and peak RSS ratio against an earlier results file; returns
+    # the number of regressions beyond tolerance
+    old = {r["id"]: r for r in json.loads(Path(old_path).read_text(encoding="utf-8"))["results"]}
+    regressions = 0
+    print(f"\n{'case':<80} {'wall':>9} {'Δwall':>8} {'rss':>8} {'Δrss':>8}")
+    for r in results:
+        prev = old.get(r["id"])
+        if prev is None or "error" in r or "error" in prev:
+            continue
+        dw = r["wall"] / prev["wall"] - 1 if prev["wall"] else 0.0
+        dr = r["peak_rss_mb"] / prev["peak_rss_mb"] - 1 if prev["peak_rss_mb"] else 0.0
+        flag = ""
+        if dw > tolerance or dr > tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{r['id']:<80} {r['wall']:8.2f}s {dw:+8.1%} {r['peak_rss_mb']:7.0f}M {dr:+8.1%}{flag}")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the preview pipeline on synthetic videos.")
+    ap.add_argument("--work", default=os.path.join(tempfile.gettempdir(), "bench_work"),
+                    help="Directory for generated inputs and outputs (default: bench_work in the temp directory)")
+    ap.add_argument("--sources", default="testsrc2", help="Comma-separated lavfi sources: testsrc2, mandelbrot (default: testsrc2)")
+    ap.add_argument("--sizes", default="640x360,1280x720", help="Input resolutions (default: 640x360,1280x720)")
+    ap.add_argument("--durations", default="30,120", help="Input durations in seconds (default: 30,120)")
+    ap.add_argument("--modes", default="fps,pipe,seek,ffmpeg-tile", help=f"Pipeline modes: {', '.join(MODES)} (default: fps,pipe,seek,ffmpeg-tile)")
+    ap.add_argument("--intervals", default="2", help="--interval values (default: 2)")
+    ap.add_argument("--tiles", default="10x10", help="--tile values (default: 10x10)")
+    ap.add_argument("--tile-sizes", default="160x90", help="--tile-size values; use ';' between values that are ladders (default: 160x90)")
+    ap.add_argument("--formats", default="webp,jpg", help="--format values (default: webp,jpg)")
+    ap.add_argument("--repeat", type=int, default=1, help="Runs per case; the median is reported (default: 1)")
+    ap.add_argument("--out", help="Results file (default: bench_results.json in --work)")
+    ap.add_argument("--compare", help="Earlier results file to compare against")
+    ap.add_argument("--timeout", type=float, help="Seconds before a case is killed and reported as failed")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="With --compare, slowdown/growth that counts as a regression (default: 0.10)")
+    ap.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.run_case:
+        run_case(json.loads(args.run_case))
+        return
+
+    split = lambda s: [v.strip() for v in s.split(",") if v.strip()]
+    unknown = set(split(args.modes)) - set(MODES)
+    if unknown:
+        ap.error(f"unknown mode(s): {', '.join(sorted(unknown))}")
+    work = Path(args.work).resolve()
+    (work / "inputs").mkdir(parents=True, exist_ok=True)
+    out = Path(args.out) if args.out else work / "bench_results.json"
+    tile_sizes = [v.strip() for v in args.tile_sizes.split(";")] if ";" in args.tile_sizes else split(args.tile_sizes)
+
+    results = []
+    grid = itertools.product(split(args.sources), split(args.sizes), map(float, split(args.durations)),
+                             split(args.modes), split(args.intervals), split(args.tiles), tile_sizes, split(args.formats))
+    for source, size, duration, mode, interval, tile, tile_size, fmt in grid:
+        inp = make_input(work / "inputs", source, size, duration)
+        case = {"source": source, "size": size, "duration": duration, "mode": mode, "interval": interval,
+                "tile": tile, "tile_size": tile_size, "format": fmt}
+        case["id"] = case_id(case)
+        outdir = work / "out" / case["id"].replace(" ", "_").replace("=", "-").replace(",", "+")
+        argv = ["--interval", interval, "--tile", tile, "--tile-size", tile_size, "--format", fmt,
+                "--link-mode", "symlink", *MODES[mode]]
+        r = bench({**case, "input": str(inp), "outdir": str(outdir), "argv": argv}, max(1, args.repeat), args.timeout)
+        results.append({"id": case["id"], "case": case, **r})
+        if "error" in r:
+            print(f"{case['id']}: FAILED {r['error']}")
+        else:
+            stages = " ".join(f"{k}={v:.2f}" for k, v in r["stages"].items())
+            print(f"{case['id']}: {r['wall']:.2f}s peak {r['peak_rss_mb']:.0f}M (children {r['children_peak_rss_mb']:.0f}M) | {stages}")
+
+    meta = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+        "platform": platform.platform(), "cpus": os.cpu_count(),
+        "ffmpeg": previews.run(["ffmpeg", "-version"]).splitlines()[0],
+    }
+    out.write_text(json.dumps({"meta": meta, "results": results}, indent=2), encoding="utf-8")
+    print(f"Wrote {out} ({len(results)} cases)")
+    if args.compare:
+        regressions = compare(args.compare, results, args.tolerance)
+        print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+# Lets a plain `pytest` from the repository root import the previews package
@@ -1,27 +1,11 @@
 #!/usr/bin/env python3
-import argparse, math, os, subprocess, sys, textwrap
+import argparse, math, sys
 from pathlib import Path
-from PIL import Image
-
-def run(cmd):
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed:\n{' '.join(cmd)}\nSTDERR:\n{p.stderr}")
-    return p.stdout.strip()
-
-def ffprobe_duration(path):
-    return float(run([
-        "ffprobe", "-v", "error", "-show_entries", "format=duration",
-        "-of", "default=nokey=1:noprint_wrappers=1", str(path)
-    ]))
-
-def hhmmss_ms(t):
-    # t in seconds -> "HH:MM:SS.mmm"
-    hrs = int(t // 3600)
-    t -= hrs * 3600
-    mins = int(t // 60)
-    secs = t - mins * 60
-    return f"{hrs:02d}:{mins:02d}:{secs:06.3f}"
+
+from previews.extract import extract_segmented
+from previews.probe import ffprobe_duration
+from previews.runner import run
+from previews.vtt import hhmmss_ms
 
 def write_demo_html(out_dir, tile_w, tile_h):
     html = f"""\
@@ -160,6 +144,7 @@ def main():
     ap.add_argument("--tile", default="10x10", help="Grid per sprite sheet: CxR (default: 10x10)")
     ap.add_argument("--tile-size", default="160x90", help="Size of each thumbnail (w x h) (default: 160x90)")
     ap.add_argument("--format", default="webp", choices=["webp","jpg","jpeg","png"], help="Sprite image format (default: webp)")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel ffmpeg workers for frame extraction (default: 1)")
     args = ap.parse_args()
 
     inp = Path(args.input)
@@ -186,7 +171,10 @@ def main():
         str(frames_dir / "thumb_%05d.jpg")
     ]
     print("Extracting frames with ffmpeg...")
-    run(extract_cmd)
+    if args.jobs > 1:
+        extract_segmented(inp, frames_dir, interval, tile_w, tile_h, total_frames, args.jobs)
+    else:
+        run(extract_cmd)
 
     # 2) Load frames, assemble sprite sheets
     frame_paths = sorted(frames_dir.glob("thumb_*.jpg"))
@@ -194,6 +182,7 @@ def main():
         print("No frames extracted; aborting.")
         sys.exit(1)
 
+    from PIL import Image
     sprite_files = []
     print("Assembling sprite sheets...")
     for sheet_idx in range(math.ceil(len(frame_paths) / per_sheet)):
@@ -236,9 +225,8 @@ def main():
     # 4) Write a ready-to-open HTML demo
     write_demo_html(outdir, tile_w, tile_h)
     print("Wrote demo.html")
-    print("\nDone. Start a static server in the output folder and open demo.html, e.g.:")
-    print(f"  cd {outdir}")
-    print(f"  python -m http.server 8000  # then visit http://localhost:8000/demo.html")
+    print("\nDone. Serve the output folder and open demo.html, e.g.:")
+    print(f"  python {Path(__file__).with_name('preview_server.py')} {outdir} --port 8000  # then visit http://localhost:8000/demo.html")
 
 if __name__ == "__main__":
     main()
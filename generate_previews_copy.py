@@ -453,15 +453,11 @@
 
 
 #!/usr/bin/env python3
-import argparse, math, os, subprocess, sys, textwrap
+import argparse, math, os, sys, textwrap
 from pathlib import Path
 from PIL import Image
 
-def run(cmd):
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed:\n{' '.join(cmd)}\nSTDERR:\n{p.stderr}")
-    return p.stdout.strip()
+from previews.runner import run
 
 def ffprobe_duration(path):
     return float(run([
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+import argparse, asyncio, email.utils, gzip, hashlib, json, mimetypes, os, re, sys, time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import previews  # stage modules (and PIL) load on first use
+
+# Async HTTP/1.1 server for preview output directories: keep-alive, byte ranges,
+# strong ETags, long-lived caching for completed sprite sheets, gzip for the text files
+# and preload hints for the first sprite sheet. One event loop on one core handles
+# hundreds of concurrent scrubbers since every response is a sendfile or a cached buffer.
+
+MIME = {".vtt": "text/vtt", ".webp": "image/webp", ".m3u8": "application/vnd.apple.mpegurl",
+        ".mpd": "application/dash+xml", ".m4s": "video/iso.segment", ".idx": "application/octet-stream",
+        ".ts": "video/mp2t", ".mkv": "video/x-matroska"}
+COMPRESSIBLE = {".vtt", ".html", ".json", ".m3u8", ".mpd", ".csv"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+SPRITE_NAME = re.compile(r"(sprite_(?:\d+x\d+_)?)(\d+)(\.\w+)")
+HASH_LIMIT = 16 << 20  # files up to this size get a content-hash ETag
+MEMO_ENTRIES = 4096    # files whose ETag / preload links are remembered
+GZIP_MEMO_BYTES = 32 << 20
+REASONS = {200: "OK", 206: "Partial Content", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 416: "Range Not Satisfiable", 500: "Internal Server Error"}
+
+def file_key(st):
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+class FileMemo:
+    # Value derived from the current version of each file, keyed by path so a rewritten
+    # file replaces its old entry; least recently used paths are dropped once the
+    # entries (or their total size, with size=len) exceed `limit`
+
+    def __init__(self, limit, size=lambda value: 1):
+        self.limit = limit
+        self.size = size
+        self.total = 0
+        self.entries = OrderedDict()
+
+    def get(self, path, st):
+        hit = self.entries.get(str(path))
+        if hit is None or hit[0] != file_key(st):
+            return None
+        self.entries.move_to_end(str(path))
+        return hit[1]
+
+    def put(self, path, st, value):
+        old = self.entries.pop(str(path), None)
+        if old is not None:
+            self.total -= self.size(old[1])
+        self.entries[str(path)] = (file_key(st), value)
+        self.total += self.size(value)
+        while self.total > self.limit and len(self.entries) > 1:
+            self.total -= self.size(self.entries.popitem(last=False)[1][1])
+
+_etags = FileMemo(MEMO_ENTRIES)
+_gzipped = FileMemo(GZIP_MEMO_BYTES, size=len)
+_preloads = FileMemo(MEMO_ENTRIES)
+_last_sheets = FileMemo(MEMO_ENTRIES)
+
+async def memoized(memo, compute, path, st):
+    # memo's value for this version of path; computed off the event loop on a miss,
+    # since hashing or compressing a file can take a while
+    value = memo.get(path, st)
+    if value is None:
+        value = await asyncio.get_running_loop().run_in_executor(None, compute, path, st)
+        memo.put(path, st, value)
+    return value
+
+def etag(path, st):
+    # Content hash for small files (sprites, playlists, cues); size+mtime for videos
+    if st.st_size <= HASH_LIMIT:
+        digest = hashlib.blake2b(path.read_bytes(), digest_size=12).hexdigest()
+    else:
+        digest = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    return f'"{digest}"'
+
+def gzip_etag(tag):
+    # The gzip-encoded body is a different representation, so it gets its own tag
+    return tag[:-1] + '-gz"'
+
+def gzipped(path, st):
+    # Compressed body, from a fresh <name>.gz next to the file or compressed here
+    gz = path.with_name(path.name + ".gz")
+    if gz.exists() and gz.stat().st_mtime_ns >= st.st_mtime_ns:
+        return gz.read_bytes()
+    return gzip.compress(path.read_bytes(), compresslevel=9, mtime=0)
+
+def last_sheets(directory, st):
+    # Names of the highest-numbered sheet of each sprite set (sprite_N, sprite_WxH_N) in
+    # a directory: the only sheets --incremental rewrites in place as a recording grows
+    last = {}
+    for name in os.listdir(directory):
+        m = SPRITE_NAME.fullmatch(name)
+        if m:
+            key = (m.group(1), m.group(3))
+            last[key] = max(last.get(key, (-1, "")), (int(m.group(2)), name))
+    return {name for _, name in last.values()}
+
+def cache_control(name, last=()):
+    # Full sprite sheets never change; the last sheet of a set can still be filled up by
+    # --incremental, so it is revalidated with its ETag like the cue files
+    if SPRITE_NAME.fullmatch(name):
+        return "no-cache" if name in last else IMMUTABLE
+    if Path(name).suffix in (".m4s", ".vtt", ".idx", ".json", ".m3u8", ".mpd", ".html"):
+        return "no-cache"
+    return "public, max-age=3600"
+
+def preload_links(path, st):
+    # Link: preload for the first sprite sheet referenced by a cue file, and for the
+    # cues themselves when the demo page is requested
+    links = []
+    vtt = path if path.suffix == ".vtt" else path.with_name("thumbnails.vtt")
+    if path.suffix == ".html" and vtt.exists():
+        links.append(f"<{vtt.name}>; rel=preload; as=fetch; crossorigin")
+    if vtt.exists():
+        with open(vtt, encoding="utf-8") as f:
+            m = re.search(r"^(\S+?)#xywh=", f.read(4096), re.M)
+        if m:
+            links.append(f"<{m.group(1)}>; rel=preload; as=image")
+    return ", ".join(links)
+
+def parse_range(header, size):
+    # Single "bytes=" range -> (start, end inclusive); None = ignore (serve everything),
+    # False = not satisfiable
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if not m.group(1):
+        n = int(m.group(2))
+        return (max(0, size - n), size - 1) if n and size else False
+    start = int(m.group(1))
+    end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+def resolve(mounts, target):
+    # URL path -> file inside one of the mounted directories, or None. Containment is
+    # checked on the normalized path, not the symlink target, so videos placed with
+    # --link-mode symlink are served.
+    path = unquote(urlsplit(target).path)
+    for prefix, root in mounts:
+        if path == prefix.rstrip("/") and prefix != "/":
+            path = prefix
+        if not path.startswith(prefix):
+            continue
+        rel = path[len(prefix):]
+        f = Path(os.path.normpath(root / rel))
+        if f != root and root not in f.parents:
+            return None
+        if f.is_dir():
+            f = next((f / n for n in ("demo.html", "index.html") if (f / n).is_file()), None)
+        return f if f is not None and f.is_file() else None
+    return None
+
+async def send(writer, status, headers, body=b""):
+    lines = [f"HTTP/1.1 {status} {REASONS[status]}"] + [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+async def respond_thumbnail(writer, mounts, method, target, base):
+    # /thumbnail?video=/path/in/mount.mp4&t=12.5[&size=320x180] -> JPEG of that frame
+    # /thumbnail/stats -> request counts and p50/p99 latency as JSON
+    url = urlsplit(target)
+    if url.path == "/thumbnail/stats":
+        body, ctype = json.dumps(previews.thumbnail_stats()).encode(), "application/json"
+        headers = {"Cache-Control": "no-store"}
+    else:
+        q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        video = resolve(mounts, q.get("video", ""))
+        try:
+            t = float(q["t"])
+            size = tuple(map(int, q.get("size", "320x180").lower().split("x")))
+            ok = video is not None and t >= 0 and len(size) == 2 and 0 < size[0] <= 4096 and 0 < size[1] <= 4096
+        except (KeyError, ValueError):
+            ok = False
+        if not ok:
+            status = 404 if "t" in q and video is None else 400
+            await send(writer, status, {**base, "Content-Length": "0"})
+            return status, 0
+        body = await asyncio.get_running_loop().run_in_executor(None, previews.thumbnail, video, t, size)
+        ctype = "image/jpeg"
+        headers = {"Cache-Control": "public, max-age=3600"}
+    headers.update({**base, "Content-Type": ctype, "Content-Length": str(len(body))})
+    await send(writer, 200, headers, body if method == "GET" else b"")
+    return 200, len(body)
+
+async def respond(writer, mounts, method, target, req):
+    base = {"Date": email.utils.formatdate(usegmt=True), "Server": "preview_server"}
+    if method not in ("GET", "HEAD"):
+        await send(writer, 405, {**base, "Allow": "GET, HEAD", "Content-Length": "0"})
+        return 405, 0
+    if urlsplit(target).path in ("/thumbnail", "/thumbnail/stats"):
+        return await respond_thumbnail(writer, mounts, method, target, base)
+    path = resolve(mounts, target)
+    if path is None:
+        body = b"Not found\n"
+        await send(writer, 404, {**base, "Content-Type": "text/plain", "Content-Length": str(len(body))},
+                   body if method == "GET" else b"")
+        return 404, 0
+    st = path.stat()
+    tag = await memoized(_etags, etag, path, st)
+    last = ()
+    if SPRITE_NAME.fullmatch(path.name):
+        last = await memoized(_last_sheets, last_sheets, path.parent, path.parent.stat())
+    compressible = path.suffix in COMPRESSIBLE
+    use_gzip = compressible and "gzip" in req.get("accept-encoding", "") and "range" not in req
+    headers = {**base, "ETag": gzip_etag(tag) if use_gzip else tag,
+               "Last-Modified": email.utils.formatdate(st.st_mtime, usegmt=True),
+               "Cache-Control": cache_control(path.name, last), "Accept-Ranges": "bytes"}
+    ctype = MIME.get(path.suffix) or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    headers["Content-Type"] = ctype + ("; charset=utf-8" if ctype.startswith("text/") else "")
+    if path.suffix in (".vtt", ".html"):
+        links = await memoized(_preloads, preload_links, path, st)
+        if links:
+            headers["Link"] = links
+    if compressible:
+        headers["Vary"] = "Accept-Encoding"
+    inm = req.get("if-none-match")
+    if inm and (inm.strip() == "*" or headers["ETag"] in [t.strip() for t in inm.split(",")]):
+        await send(writer, 304, {k: v for k, v in headers.items() if k not in ("Content-Type", "Accept-Ranges")})
+        return 304, 0
+
+    if use_gzip:
+        body = await memoized(_gzipped, gzipped, path, st)
+        headers.update({"Content-Encoding": "gzip", "Content-Length": str(len(body))})
+        await send(writer, 200, headers, body if method == "GET" else b"")
+        return 200, len(body)
+
+    status, start, end = 200, 0, st.st_size - 1
+    rng = req.get("range")
+    if rng and req.get("if-range", tag) == tag:
+        r = parse_range(rng, st.st_size)
+        if r is False:
+            headers.update({"Content-Range": f"bytes */{st.st_size}", "Content-Length": "0"})
+            await send(writer, 416, headers)
+            return 416, 0
+        if r is not None:
+            status, (start, end) = 206, r
+            headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+    count = end - start + 1
+    headers["Content-Length"] = str(count)
+    await send(writer, status, headers)
+    if method == "GET" and count > 0:
+        with open(path, "rb") as f:
+            await asyncio.get_running_loop().sendfile(writer.transport, f, start, count)
+    return status, count
+
+async def handle(reader, writer, mounts, log, idle=15.0):
+    # Keep-alive loop: one request at a time per connection
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), idle)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            parts = lines[0].split()
+            if len(parts) != 3:
+                await send(writer, 400, {"Content-Length": "0", "Connection": "close"})
+                return
+            method, target, version = parts
+            req = {}
+            for line in lines[1:]:
+                k, sep, v = line.partition(":")
+                if sep:
+                    req[k.strip().lower()] = v.strip()
+            started = time.perf_counter()
+            try:
+                status, n = await respond(writer, mounts, method, target, req)
+            except (ConnectionError, asyncio.CancelledError):
+                return
+            except Exception as e:
+                print(f"error serving {target}: {e}", file=sys.stderr)
+                await send(writer, 500, {"Content-Length": "0", "Connection": "close"})
+                return
+            if log:
+                print(f'{writer.get_extra_info("peername")[0]} "{method} {target}" {status} {n} '
+                      f'{(time.perf_counter() - started) * 1000:.1f}ms', file=sys.stderr)
+            conn = req.get("connection", "").lower()
+            if conn == "close" or (version == "HTTP/1.0" and conn != "keep-alive"):
+                return
+    finally:
+        writer.close()
+
+def parse_mounts(dirs):
+    # "outdir" or "name=outdir"; a single directory is served at /, several at /<name>/
+    mounts = []
+    for d in dirs:
+        name, sep, path = d.partition("=")
+        if not sep:
+            name, path = Path(d).resolve().name, d
+        root = Path(path).resolve()
+        if not root.is_dir():
+            raise SystemExit(f"Not a directory: {path}")
+        mounts.append((f"/{name.strip('/')}/" if len(dirs) > 1 else "/", root))
+    return mounts
+
+async def serve(mounts, host, port, log):
+    server = await asyncio.start_server(lambda r, w: handle(r, w, mounts, log), host, port,
+                                        limit=1 << 16, backlog=1024)
+    for prefix, root in mounts:
+        print(f"Serving {root} at http://{host}:{port}{prefix}")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve preview output directories over HTTP (ranges, ETags, caching).")
+    ap.add_argument("dirs", nargs="+", help="Output directories to serve; several are mounted at /<name>/ (name=path to rename)")
+    ap.add_argument("--host", default="127.0.0.1", help="Address to bind (default: 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=8000, help="Port (default: 8000)")
+    ap.add_argument("--log", action="store_true", help="Print one line per request to stderr")
+    args = ap.parse_args()
+    try:
+        asyncio.run(serve(parse_mounts(args.dirs), args.host, args.port, args.log))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import importlib
+
+# Video preview pipeline (sprite sheets, WebVTT cues, posters, HLS/DASH) as a library.
+# Names are re-exported from their stage modules on first use, so `import previews`
+# loads nothing until a stage is needed (PIL and NumPy only come with the stages using them).
+
+_MODULES = {
+    "runner": ["RUN_TAIL_BYTES", "KILL_GRACE", "OutputTail", "in_context", "spawn", "reap", "kill_group",
+               "cancel_all", "cancel_scope", "run", "iter_lines", "PROGRESS_KEYS", "drain_stderr"],
+    "metrics": ["Progress", "io_bytes", "Metrics", "read_prom_totals", "write_prom", "BACKGROUND_STAGES"],
+    "probe": ["MediaInfo", "MEDIA_INFO_ENTRIES", "probe_keyframes", "probe_media", "ffprobe_duration",
+              "ffprobe_keyframes"],
+    "vtt": ["hhmmss_ms", "parse_ts", "read_vtt_tail", "CUE_CHUNK", "IDX_HEADER", "IDX_RECORD", "IDX_DTYPE",
+            "uniform_cue_rows", "cue_rows", "write_vtt", "write_cue_index", "find_cue"],
+    "extract": ["tile_vf", "extract_fps", "split_ranges", "decoder_threads", "extract_segmented",
+                "extract_at_times", "snap_to_keyframes", "extract_keyframes", "iter_raw_frames",
+                "raw_frames_cmd", "scene_scores", "pick_scene_times"],
+    "dedup": ["phash", "popcount64", "dedup_tiles"],
+    "sprite": ["DEFAULT_QUALITY", "PIL_FORMATS", "sprite_save_kwargs", "save_sprite", "paste_tile", "compose_sheet",
+               "SpriteWriter", "assemble_sprites", "content_box", "rescale_tile", "assemble_ladder",
+               "ffmpeg_sprite_args", "tile_sprites_ffmpeg"],
+    "pack": ["SAMPLE_TILES", "SHEET_MAX_SIDE", "QUALITIES", "AUTO_FORMATS", "sample_tiles", "ssim", "encode_sheet",
+             "search_quality", "choose_grid", "plan_sprites"],
+    "poster": ["sharpness", "pick_poster_tile", "extract_poster"],
+    "thumbs": ["FrameDecoder", "THUMB_BUCKET", "THUMB_CACHE_BYTES", "THUMB_DECODERS", "THUMB_REUSE_WINDOW",
+               "close_decoders", "decode_frame", "thumbnail", "thumbnail_stats"],
+    "cache": ["FINGERPRINT_ENTRIES", "fingerprint", "cache_key", "cache_lookup", "cache_restore", "cache_store", "cache_evict"],
+    "place": ["place_file", "FICLONE", "reflink", "fast_copy", "LINK_MODES", "place_video", "BROWSER_VIDEO",
+              "BROWSER_AUDIO", "BROWSER_PIX_FMT", "browser_safe", "remux_cmd", "transcode_cmd", "web_video"],
+    "streaming": ["package_hls", "package_dash", "MP4_CONTAINERS", "mp4_boxes", "mp4_find", "mp4_video_track",
+                  "mp4_sync_samples", "write_iframe_playlist", "split_attrs", "package_video"],
+    "cli": ["parse_sizes", "quality_value", "add_preview_args", "check_preview_args", "generate", "main"],
+}
+_EXPORTS = {name: module for module, names in _MODULES.items() for name in names}
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
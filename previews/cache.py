@@ -0,0 +1,106 @@
+import hashlib, json, os, shutil, threading
+from collections import OrderedDict
+
+from .place import place_file
+
+# Content-addressed cache of generated previews, keyed by input fingerprint and options.
+
+FINGERPRINT_ENTRIES = 4096  # remembered fingerprints, least recently used dropped first
+_fingerprints = OrderedDict()
+_fingerprints_lock = threading.Lock()
+
+def fingerprint(path, samples=16, block=1 << 16):
+    # Fast content fingerprint: size + mtime + hash of evenly spaced blocks
+    # (remembered per path/size/mtime so repeated stages don't re-read the blocks)
+    st = path.stat()
+    memo = (str(path), st.st_size, st.st_mtime_ns, samples, block)
+    with _fingerprints_lock:
+        digest = _fingerprints.get(memo)
+        if digest is not None:
+            _fingerprints.move_to_end(memo)
+            return digest
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{st.st_size}:{st.st_mtime_ns}".encode())
+    with open(path, "rb") as f:
+        span = max(0, st.st_size - block)
+        for i in range(samples):
+            f.seek(span * i // max(1, samples - 1))
+            h.update(f.read(block))
+    digest = h.hexdigest()
+    with _fingerprints_lock:
+        _fingerprints[memo] = digest
+        while len(_fingerprints) > FINGERPRINT_ENTRIES:
+            _fingerprints.popitem(last=False)
+    return digest
+
+def cache_key(inp, args):
+    # Fingerprint of the input plus every argument that changes the generated files
+    opts = {
+        "interval": float(args.interval),
+        "tile": args.tile.lower(),
+        "tile_size": args.tile_size.lower(),
+        "format": args.format,
+        "quality": args.quality,
+        "pack": [args.ssim, args.sheet_bytes] if "auto" in (args.tile.lower(), args.format, args.quality) else None,
+        "extract": args.extract,
+        "engine": args.engine,
+        "pipe": bool(args.pipe),
+        "dedup": args.dedup_threshold if args.dedup else None,
+        "adaptive": [args.budget, args.scene_threshold, args.min_gap] if args.adaptive else None,
+        "web_video": [args.web_video, args.target_width, args.bitrate] if args.web_video != "off" else None,
+        "package": [args.hls, args.dash, args.segment] if args.hls or args.dash else None,
+        "poster": args.poster,
+        "poster_candidates": max(1, args.poster_candidates) if args.poster == "tile" else None,
+        "incremental": bool(args.incremental),
+    }
+    h = hashlib.blake2b(digest_size=16)
+    h.update(fingerprint(inp).encode())
+    h.update(json.dumps(opts, sort_keys=True).encode())
+    return h.hexdigest()
+
+def cache_lookup(cache_dir, key):
+    entry = cache_dir / key
+    manifest = entry / "manifest.json"
+    if not manifest.exists():
+        return None
+    os.utime(manifest)  # mark as recently used for LRU eviction
+    return json.loads(manifest.read_text(encoding="utf-8"))["files"]
+
+def cache_restore(cache_dir, key, files, outdir):
+    for name in files:
+        (outdir / name).parent.mkdir(parents=True, exist_ok=True)
+        place_file(cache_dir / key / name, outdir / name)
+
+def cache_store(cache_dir, key, files, outdir):
+    # Copy outputs into a temp dir and rename it into place, so readers never see partial entries
+    entry = cache_dir / key
+    if entry.exists():
+        return
+    tmp = cache_dir / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    for name in files:
+        (tmp / name).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(outdir / name, tmp / name)
+    (tmp / "manifest.json").write_text(json.dumps({"files": files}), encoding="utf-8")
+    try:
+        tmp.rename(entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)  # another run stored it first
+
+def cache_evict(cache_dir, max_bytes):
+    # Drop least recently used entries until the cache fits in max_bytes
+    entries = []
+    for entry in cache_dir.iterdir():
+        manifest = entry / "manifest.json"
+        if entry.name.startswith(".") or not manifest.exists():
+            continue
+        size = sum(f.stat().st_size for f in entry.rglob("*") if f.is_file())
+        entries.append((manifest.stat().st_mtime, size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        print(f"  evicted cache entry {entry.name} ({size} bytes)")
@@ -0,0 +1,472 @@
+import argparse, json, math, os, re, sys, threading, time
+from pathlib import Path
+
+from .metrics import Metrics, Progress, write_prom
+from .cache import cache_evict, cache_key, cache_lookup, cache_restore, cache_store
+from .place import place_video, web_video
+from .runner import in_context
+
+# The preview CLI: shared options, their checks and the generate() pipeline. Stage
+# modules that pull in PIL/NumPy are imported past the cache check, so --help and cache
+# hits never load them.
+
+def parse_sizes(spec):
+    # "160x90,320x180" -> [(160, 90), (320, 180)]
+    return [tuple(map(int, size.strip().lower().split("x"))) for size in spec.split(",") if size.strip()]
+
+def quality_value(value):
+    # --quality: 1-100 or "auto"
+    if value == "auto":
+        return value
+    if not 1 <= int(value) <= 100:
+        raise argparse.ArgumentTypeError(f"expected 1-100 or auto, got {value}")
+    return int(value)
+
+def add_preview_args(ap):
+    # Options shared by this CLI and batch_previews.py
+    ap.add_argument("--interval", type=float, default=2.0, help="Seconds per thumbnail frame (default: 2.0)")
+    ap.add_argument("--tile", default="10x10",
+                    help="Grid per sprite sheet: CxR, or auto = the fewest sheets within --sheet-bytes, "
+                         "shaped so the last sheet is not mostly empty (default: 10x10)")
+    ap.add_argument("--tile-size", default="160x90",
+                    help="Size of each thumbnail (w x h); a comma-separated list (e.g. 160x90,320x180) "
+                         "builds one sprite set per size from a single decode (default: 160x90)")
+    ap.add_argument("--format", default="webp", choices=["webp","jpg","jpeg","png","auto"],
+                    help="Sprite image format; auto = webp or jpg, whichever is smaller at --ssim (default: webp)")
+    ap.add_argument("--quality", type=quality_value,
+                    help="Sprite encoder quality 1-100, or auto = the lowest that keeps --ssim on a sample sheet "
+                         "(default: 80 for webp, 85 for jpg; always auto with --format auto)")
+    ap.add_argument("--ssim", type=float, default=0.98,
+                    help="With auto format/quality, minimum SSIM of the encoded sample sheet (default: 0.98)")
+    ap.add_argument("--sheet-bytes", type=int, default=256 << 10,
+                    help="With --tile auto, target maximum size of one sprite sheet in bytes (default: 262144)")
+    ap.add_argument("--extract", default="fps", choices=["fps","seek","keyframe"],
+                    help="Frame extraction: fps = decode everything through the fps filter, "
+                         "seek = input-side seek to each timestamp, "
+                         "keyframe = snap each timestamp to the nearest keyframe (default: fps)")
+    ap.add_argument("--jobs", type=int, default=1, help="Parallel ffmpeg workers for frame extraction (default: 1)")
+    ap.add_argument("--pipe", action="store_true",
+                    help="Stream raw RGB frames from ffmpeg straight into the sprite sheets (no frames/ directory)")
+    ap.add_argument("--engine", default="pil", choices=["pil","ffmpeg-tile"],
+                    help="Sprite sheet builder: pil = paste tiles in Python, "
+                         "ffmpeg-tile = ffmpeg's tile filter in the decode pass (default: pil)")
+    ap.add_argument("--encode-workers", type=int, default=1,
+                    help="Sprite sheets composed/encoded concurrently (default: 1)")
+    ap.add_argument("--cache-dir", default=os.environ.get("PREVIEW_CACHE_DIR"),
+                    help="Reuse previews of unchanged inputs from this directory (default: $PREVIEW_CACHE_DIR, off if unset)")
+    ap.add_argument("--cache-max-bytes", type=int, default=2 << 30,
+                    help="Evict least recently used cache entries beyond this size (default: 2 GiB)")
+    ap.add_argument("--adaptive", action="store_true",
+                    help="Place tiles at scene changes instead of every --interval seconds (variable-length cues)")
+    ap.add_argument("--budget", type=int,
+                    help="With --adaptive, number of tiles; budget the scene changes leave is spent splitting the longest "
+                         "cues, down to --min-gap (default: what --interval would produce)")
+    ap.add_argument("--scene-threshold", type=float, default=0.3,
+                    help="With --adaptive, minimum ffmpeg scene score (0-1) that earns a tile (default: 0.3)")
+    ap.add_argument("--min-gap", type=float, default=1.0,
+                    help="With --adaptive, minimum seconds between tiles (default: 1.0)")
+    ap.add_argument("--dedup", action="store_true",
+                    help="Store near-identical tiles once and point repeated cues at the first occurrence")
+    ap.add_argument("--dedup-threshold", type=int, default=2,
+                    help="With --dedup, maximum perceptual-hash bit difference (of 64) that counts as a duplicate (default: 2)")
+    ap.add_argument("--poster", default="seek", choices=["seek","tile"],
+                    help="thumbnail.jpg source: seek = the midpoint, tile = the time of an extracted tile "
+                         "near the middle (see --poster-candidates) (default: seek)")
+    ap.add_argument("--poster-candidates", type=int, default=1,
+                    help="With --poster tile, pick the sharpest of the K tiles nearest the middle (default: 1)")
+    ap.add_argument("--link-mode", default="auto", choices=["auto","copy","hardlink","symlink","reflink"],
+                    help="How the source video is placed in outdir; auto = reflink, else hardlink, else copy (default: auto)")
+    ap.add_argument("--web-video", default="off", choices=["off","auto","remux","transcode"],
+                    help="Write a browser-friendly MP4 (faststart) instead of placing the raw input, while sprites "
+                         "are generated: auto = remux H.264/AAC inputs, transcode anything else (default: off)")
+    ap.add_argument("--target-width", type=int, default=1280, help="With --web-video, transcode width (default: 1280)")
+    ap.add_argument("--bitrate", default="1800k", help="With --web-video, maximum video bitrate when transcoding (default: 1800k)")
+    ap.add_argument("--hls", action="store_true",
+                    help="Also package the video as fMP4 HLS in outdir/hls, with an I-frame-only playlist for trick play")
+    ap.add_argument("--dash", action="store_true", help="Also package the video as DASH in outdir/dash")
+    ap.add_argument("--segment", type=float, default=4.0, help="With --hls/--dash, target segment length in seconds (default: 4.0)")
+    ap.add_argument("--metrics-jsonl", help="Append per-stage spans and ffmpeg progress events to this JSON-lines file")
+    ap.add_argument("--metrics-prom", help="Write stage/throughput metrics in Prometheus text format to this file "
+                                           "(counters accumulate across runs that share it)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Only process footage from the last cue of an existing thumbnails.vtt in outdir on "
+                         "(for recordings that are still growing); the output matches a full run")
+
+def check_preview_args(ap, args):
+    try:
+        sizes = parse_sizes(args.tile_size)
+    except ValueError:
+        sizes = []
+    if not sizes or any(w <= 0 or h <= 0 for w, h in sizes):
+        ap.error(f"--tile-size expects WxH[,WxH...], got {args.tile_size!r}")
+    if args.tile.lower() != "auto" and not re.fullmatch(r"[1-9]\d*x[1-9]\d*", args.tile.lower()):
+        ap.error(f"--tile expects CxR or auto, got {args.tile!r}")
+    if args.format == "auto" and args.quality not in (None, "auto"):
+        ap.error("--format auto searches the quality itself; drop --quality")
+    if args.format == "png" and args.quality is not None:
+        ap.error("--quality does not apply to png sprites")
+    if args.incremental and "auto" in (args.tile.lower(), args.format, args.quality):
+        ap.error("--incremental needs a fixed --tile, --format and --quality to continue existing sheets")
+    if len(sizes) > 1 and (args.incremental or args.engine == "ffmpeg-tile"):
+        ap.error("several --tile-size values cannot be combined with --incremental or --engine ffmpeg-tile")
+    if args.dedup and (args.incremental or args.engine == "ffmpeg-tile"):
+        ap.error("--dedup cannot be combined with --incremental or --engine ffmpeg-tile")
+    if args.adaptive and (args.incremental or args.pipe or args.engine == "ffmpeg-tile" or args.extract == "keyframe"):
+        ap.error("--adaptive cannot be combined with --incremental, --pipe, --engine ffmpeg-tile or --extract keyframe")
+    if args.incremental and (args.extract == "keyframe" or args.engine == "ffmpeg-tile"):
+        ap.error("--incremental supports --extract fps/seek with the pil engine")
+    if args.web_video != "off" and args.incremental:
+        ap.error("--web-video cannot be combined with --incremental")
+    if args.pipe and (args.extract != "fps" or args.jobs > 1):
+        ap.error("--pipe only supports --extract fps with --jobs 1")
+    if args.engine == "ffmpeg-tile" and (args.extract != "fps" or args.pipe):
+        ap.error("--engine ffmpeg-tile only supports --extract fps without --pipe")
+
+def generate(args):
+    # Run the whole pipeline for args.input -> args.outdir; returns a small stats dict
+    # with wall seconds per stage under "timings" and the full spans under "spans"
+    # Use absolute paths to resolve path issues
+    inp = Path(args.input).resolve()
+    outdir = Path(args.outdir).resolve()
+    outdir.mkdir(parents=True, exist_ok=True)
+    frames_dir = outdir / "frames"
+    metrics = Metrics(args.metrics_jsonl, input=inp.name)
+    lap = metrics.lap
+
+    def finish(stats):
+        stats.update(timings=metrics.timings(), spans=metrics.spans)
+        metrics.event("run", **{k: v for k, v in stats.items() if k not in ("timings", "spans")})
+        if args.metrics_prom:
+            write_prom(args.metrics_prom, metrics, stats)
+        return stats
+
+    # Place input video in output directory. Reflinks and hardlinks are instant; a
+    # real copy runs in the background while frames are extracted. With --web-video a
+    # remuxed/transcoded MP4 takes its place (started once the input is probed).
+    web = args.web_video != "off"
+    video_filename = f"{inp.stem}.mp4" if web else inp.name
+    if web and outdir / video_filename == inp:
+        video_filename = f"{inp.stem}_web.mp4"
+    video_dest = outdir / video_filename
+    placed = {}
+    placer = None
+
+    def place(fn, *fn_args):
+        started, cpu = time.perf_counter(), time.thread_time()
+        try:
+            placed["mode"] = fn(*fn_args)
+        except Exception as e:
+            placed["error"] = e
+        metrics.add("web_video" if web else "copy", time.perf_counter() - started, time.thread_time() - cpu)
+
+    if not web and args.link_mode in ("copy", "auto"):
+        placer = threading.Thread(target=in_context(place), args=(place_video, inp, video_dest, args.link_mode),
+                                  daemon=True)
+        placer.start()
+    elif not web:
+        placed["mode"] = place_video(inp, video_dest, args.link_mode)
+
+    def finish_placement():
+        if placer is not None:
+            placer.join()
+        if "error" in placed:
+            raise placed["error"]
+        print(f"Placed {video_filename} ({placed['mode']})")
+
+    cache_dir = Path(args.cache_dir).expanduser().resolve() if args.cache_dir else None
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        key = cache_key(inp, args)
+        files = cache_lookup(cache_dir, key)
+        if files is not None:
+            cache_restore(cache_dir, key, files, outdir)
+            print(f"Cache hit ({key}): restored {len(files)} files.")
+            if web:
+                placed["mode"] = "cached"
+            finish_placement()
+            lap("cache")
+            return finish({"frames": 0, "sheets": sum(f.startswith("sprite_") for f in files), "duration": None,
+                           "cached": True})
+    lap("setup")
+
+    from .probe import probe_media
+    from .vtt import cue_rows, read_vtt_tail, uniform_cue_rows, write_cue_index, write_vtt
+    from .extract import (extract_at_times, extract_fps, extract_keyframes, extract_segmented, iter_raw_frames,
+                          pick_scene_times, raw_frames_cmd, scene_scores)
+    from .dedup import dedup_tiles
+    from .sprite import assemble_ladder, assemble_sprites, content_box, tile_sprites_ffmpeg
+    from .poster import extract_poster, pick_poster_tile
+    from .pack import plan_sprites
+    from .streaming import package_video
+
+    sizes = parse_sizes(args.tile_size)
+    # Decode once at the largest size; smaller rungs of a ladder are scaled from it
+    tile_w, tile_h = max(sizes, key=lambda size: size[0] * size[1])
+    ladder = len(sizes) > 1
+    listed = list(sizes)
+    default_size = listed[0]
+    if ladder:
+        sizes.remove((tile_w, tile_h))
+        sizes.insert(0, (tile_w, tile_h))
+    media = probe_media(inp, keyframes=args.extract == "keyframe")
+    duration = media.duration
+    interval = float(args.interval)
+    total_frames = int(math.ceil(duration / interval))
+    print(f"Duration: {duration:.3f}s | {media.video_codec} {media.width}x{media.height} @ {media.fps:.3f}fps | "
+          f"interval={interval}s -> {total_frames} frames | grid={args.tile.lower()}")
+    lap("probe")
+    if web:
+        # Runs alongside sprite generation; joined in finish_placement()
+        print(f"Writing {video_filename} for the web ({args.web_video}) in the background...")
+        placer = threading.Thread(target=in_context(place), daemon=True,
+                                  args=(web_video, inp, video_dest, media, args.web_video, args.target_width, args.bitrate,
+                                        Progress(video_filename, duration, metrics, every=10.0)))
+        placer.start()
+
+    packaged = {}
+    packager = None
+
+    def package():
+        # From the web MP4 once it is written, else straight from the input
+        try:
+            if web:
+                placer.join()
+                if "error" in placed:
+                    return
+            started, cpu = time.perf_counter(), time.thread_time()
+            packaged["files"] = package_video(video_dest if web else inp, outdir, args.hls, args.dash, args.segment)
+            metrics.add("package", time.perf_counter() - started, time.thread_time() - cpu)
+        except Exception as e:
+            packaged["error"] = e
+
+    if args.hls or args.dash:
+        print("Packaging " + " and ".join(n for n, on in (("HLS", args.hls), ("DASH", args.dash)) if on)
+              + " in the background...")
+        packager = threading.Thread(target=in_context(package), daemon=True)
+        packager.start()
+    # The fps filter keeps the frame nearest the middle of each interval; seek modes use the same spot
+    sample_times = [(idx * interval + min(duration, (idx + 1) * interval)) / 2 for idx in range(total_frames)]
+
+    scene_times = None
+    if args.adaptive:
+        # Tiles at scene changes; each cue runs until the next change
+        print("Scoring scene changes...")
+        budget = args.budget or total_frames
+        scene_times = pick_scene_times(scene_scores(inp, threshold=args.scene_threshold), budget, args.scene_threshold,
+                                       args.min_gap, duration)
+        total_frames = len(scene_times)
+        sample_times = scene_times
+        print(f"  {total_frames} tiles (budget {budget}, threshold {args.scene_threshold})")
+        lap("scene")
+
+    # Sprite grid, format and quality; "auto" values are resolved from a sample sheet
+    fmt, quality = args.format, args.quality
+    if "auto" in (args.tile.lower(), fmt, quality):
+        print("Planning sprite sheets from sample tiles...")
+        plan = plan_sprites(inp, duration, total_frames, tile_w, tile_h, fmt, quality, args.tile,
+                            args.ssim, args.sheet_bytes)
+        cols, rows, fmt, quality = plan["cols"], plan["rows"], plan["format"], plan["quality"]
+        print(f"  grid={cols}x{rows} format={fmt} quality={quality or 'default'} | sample SSIM {plan['ssim']:.3f}, "
+              f"~{plan['tile_bytes'] * cols * rows / 1024:.0f} KiB per full sheet")
+        lap("plan")
+    else:
+        cols, rows = map(int, args.tile.lower().split("x"))
+    per_sheet = cols * rows
+    if ladder:
+        rungs = [(w, h, f"sprite_{w}x{h}_%d.{fmt}", f"thumbnails_{w}x{h}") for w, h in dict.fromkeys(sizes)]
+    else:
+        rungs = [(tile_w, tile_h, f"sprite_%d.{fmt}", "thumbnails")]
+
+    # 0) Pick up where an earlier run on a growing recording stopped
+    start = resume = extract_from = 0
+    last_cue = None
+    vtt_path = outdir / "thumbnails.vtt"
+    if args.incremental and vtt_path.exists():
+        last_cue = read_vtt_tail(vtt_path)
+    if last_cue is not None:
+        # The last cue is redone: its interval, and so the frame sampled for it, grew
+        # with the recording
+        start = int(round(last_cue["start"] / interval))
+        pos = start % per_sheet
+        expected = (f"sprite_{start // per_sheet}.{fmt}",
+                    (pos % cols) * tile_w, (pos // cols) * tile_h, tile_w, tile_h)
+        if (last_cue["url"], last_cue["x"], last_cue["y"], last_cue["w"], last_cue["h"]) != expected:
+            print("Existing thumbnails.vtt was generated with different --interval/--tile/--tile-size/--format; "
+                  "run without --incremental.")
+            sys.exit(1)
+        # Its sheet is composed again from its first tile, so it is encoded once from the
+        # source tiles like in a full run rather than decoded and re-encoded. Those tiles
+        # come from frames/ when it still has them, else they are extracted again.
+        resume = extract_from = start - pos
+        if not args.pipe and all((frames_dir / f"thumb_{idx+1:05d}.jpg").exists() for idx in range(resume, start)):
+            extract_from = start
+        print(f"Incremental: {start} thumbnails up to {last_cue['start']:.3f}s already done, "
+              f"{max(0, total_frames - extract_from)} to extract")
+
+    # Live ffmpeg progress for the single-pass decoders
+    progress = Progress("extract", max(0.0, duration - extract_from * interval), metrics)
+
+    # 1) Extract normalized thumbnails (letterboxed to tile_w x tile_h)
+    #    We maintain aspect ratio and pad to exact tile size.
+    if start >= total_frames:
+        tiles = None
+        sprite_files = []
+    elif args.engine == "ffmpeg-tile":
+        # 1+2) ffmpeg decodes, tiles and encodes the sheets in one pass
+        print("Building sprite sheets with ffmpeg tile filter...")
+        tiles = None
+        sprite_files = tile_sprites_ffmpeg(inp, outdir, interval, tile_w, tile_h, cols, rows,
+                                           fmt, total_frames, max(1, args.jobs), progress, quality)
+    elif scene_times is not None:
+        frames_dir.mkdir(exist_ok=True)
+        print("Extracting scene-change frames with ffmpeg...")
+        # Nudge below the reported pts so the accurate seek lands on that frame, not the next
+        extract_at_times(inp, frames_dir, [max(0.0, t - 0.0005) for t in scene_times], tile_w, tile_h,
+                         jobs=max(1, args.jobs))
+        print("Assembling sprite sheets...")
+        tiles = [frames_dir / f"thumb_{idx+1:05d}.jpg" for idx in range(total_frames)]
+    elif args.pipe:
+        # 1+2) Decode straight into the sprite sheets
+        print("Streaming frames from ffmpeg into sprite sheets...")
+        tiles = iter_raw_frames(raw_frames_cmd(inp, interval, tile_w, tile_h, extract_from), tile_w, tile_h, progress)
+    else:
+        frames_dir.mkdir(exist_ok=True)
+        print(f"Extracting frames with ffmpeg ({args.extract})...")
+        targets = sample_times
+        jobs = max(1, args.jobs)
+        if args.extract == "seek":
+            extract_at_times(inp, frames_dir, targets[extract_from:], tile_w, tile_h, jobs=jobs, start=extract_from)
+        elif args.extract == "keyframe":
+            extract_keyframes(inp, frames_dir, targets, tile_w, tile_h, outdir / "keyframe_offsets.csv", jobs=jobs)
+        elif jobs > 1 or extract_from:
+            extract_segmented(inp, frames_dir, interval, tile_w, tile_h, total_frames, jobs, extract_from, progress)
+        else:
+            extract_fps(inp, frames_dir, interval, tile_w, tile_h, progress)
+
+        # 2) Load frames, assemble sprite sheets
+        if last_cue is not None:
+            frame_paths = [frames_dir / f"thumb_{idx+1:05d}.jpg" for idx in range(resume, total_frames)]
+            frame_paths = [fp for fp in frame_paths if fp.exists()]
+        else:
+            frame_paths = sorted(frames_dir.glob("thumb_*.jpg"))
+        if not frame_paths:
+            print("No frames extracted; aborting.")
+            sys.exit(1)
+        print("Assembling sprite sheets...")
+        tiles = frame_paths
+
+    # With --pipe (and the ffmpeg tile engine) decoding happens inside assembly
+    lap("extract")
+    timings = {}
+    slots = None
+    if tiles is not None and args.dedup:
+        slots = []
+        tiles = dedup_tiles(tiles, slots, args.dedup_threshold)
+    rung_sprites = None
+    if tiles is not None and ladder:
+        print(f"  {len(rungs)} sizes: " + ", ".join(f"{w}x{h}" for w, h, _, _ in rungs))
+        rung_sprites = assemble_ladder(tiles, outdir, cols, rows, [r[:3] for r in rungs],
+                                       content_box(media, tile_w, tile_h), fmt,
+                                       workers=max(1, args.encode_workers), timings=timings, quality=quality)
+        sprite_files = [name for names in rung_sprites for name in names]
+    elif tiles is not None:
+        sprite_files = assemble_sprites(tiles, outdir, cols, rows, tile_w, tile_h, fmt,
+                                        workers=max(1, args.encode_workers), start=resume, timings=timings,
+                                        quality=quality)
+    if slots:
+        unique = max(slots) + 1
+        print(f"  dedup: {len(slots)} tiles -> {unique} unique ({1 - unique / len(slots):.1%} saved)")
+        # Cues follow total_frames; cover any frame the extractor did not deliver
+        slots = (slots + slots[-1:] * total_frames)[:total_frames]
+    if not sprite_files and last_cue is None:
+        print("No frames extracted; aborting.")
+        sys.exit(1)
+    if last_cue is not None:
+        # Completed sheets were not rewritten but are still referenced by the cues
+        sprite_files = [f"sprite_{i}.{fmt}" for i in range(int(math.ceil(total_frames / per_sheet)))]
+
+    lap("assemble")
+    if "encode" in timings:
+        metrics.add("encode", timings["encode"])  # part of assemble, summed over sheets
+
+    # 3) Write WebVTT mapping time -> sprite#xywh, plus the binary cue index, per size
+    first = start
+    if scene_times is not None or slots:
+        starts = scene_times if scene_times is not None else [idx * interval for idx in range(total_frames)]
+        ends = starts[1:] + [duration] if scene_times is not None else [min(duration, t + interval) for t in starts]
+        cue_table = lambda a, w, h: cue_rows(starts, ends, slots or range(total_frames), cols, per_sheet, w, h)
+    else:
+        cue_table = lambda a, w, h: uniform_cue_rows(a, total_frames, interval, duration, cols, per_sheet, w, h)
+    cue_files = []
+    for w, h, sprite_pattern, stem in rungs:
+        rung_vtt, index_path = outdir / f"{stem}.vtt", outdir / f"{stem}.idx"
+        if last_cue is not None:
+            # Rewrite the last cue (its end may have been clipped to the old duration) and append
+            write_vtt(rung_vtt, cue_table(first, w, h), sprite_pattern, w, h, append_at=last_cue["offset"])
+            print(f"Rewrote the last cue of {rung_vtt.name} and appended {max(0, total_frames - start - 1)}")
+        else:
+            write_vtt(rung_vtt, cue_table(0, w, h), sprite_pattern, w, h)
+            print(f"Wrote {rung_vtt.name}")
+        if first and index_path.exists():
+            write_cue_index(index_path, cue_table(first, w, h), sprite_pattern, w, h, first=first)
+        else:
+            write_cue_index(index_path, cue_table(0, w, h), sprite_pattern, w, h)
+        print(f"Wrote {index_path.name}")
+        cue_files += [rung_vtt.name, index_path.name]
+    if ladder:
+        # thumbnails.vtt keeps pointing at the first size listed for players that know one track
+        w, h, sprite_pattern, _ = next(r for r in rungs if r[:2] == default_size)
+        write_vtt(vtt_path, cue_table(0, w, h), sprite_pattern, w, h)
+        manifest = {
+            "interval": interval, "duration": duration, "tile": f"{cols}x{rows}",
+            "default": f"thumbnails_{w}x{h}.vtt",
+            "sizes": sorted(({"width": w, "height": h, "vtt": f"{stem}.vtt", "index": f"{stem}.idx", "sprites": names}
+                             for (w, h, _, stem), names in zip(rungs, rung_sprites)),
+                            key=lambda e: listed.index((e["width"], e["height"]))),
+        }
+        (outdir / "thumbnails.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        print("Wrote thumbnails.vtt and thumbnails.json")
+        cue_files += ["thumbnails.vtt", "thumbnails.json"]
+
+    lap("vtt")
+
+    # 4) Generate a full-resolution thumbnail near the midpoint of the video
+    print("Generating thumbnail...")
+    poster_time = duration / 2
+    if args.poster == "tile":
+        # sprite_files starts with the sheets of the decoded (largest) size
+        idx, poster_time = pick_poster_tile(outdir, sprite_files, sample_times, duration,
+                                            cols, per_sheet, tile_w, tile_h, max(1, args.poster_candidates), slots)
+        print(f"  using tile {idx} at {poster_time:.3f}s")
+    extract_poster(inp, poster_time, outdir / "thumbnail.jpg")
+    print("Wrote thumbnail.jpg")
+    lap("poster")
+
+    # Waiting on the background stages (copy, web video, packaging)
+    finish_placement()
+    if packager is not None:
+        packager.join()
+        if "error" in packaged:
+            raise packaged["error"]
+    lap("place")
+
+    if cache_dir is not None:
+        files = sprite_files + cue_files + ["thumbnail.jpg"] + ([video_filename] if web else [])
+        files += packaged.get("files", [])
+        if (outdir / "keyframe_offsets.csv").exists() and args.extract == "keyframe":
+            files.append("keyframe_offsets.csv")
+        cache_store(cache_dir, key, files, outdir)
+        cache_evict(cache_dir, args.cache_max_bytes)
+        lap("cache")
+    print("\nDone. Generated sprite sheets, WebVTT, and thumbnail.")
+    return finish({"frames": max(0, total_frames - extract_from), "sheets": len(sprite_files), "duration": duration,
+                   "cached": False})
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate sprite sheets + WebVTT for hover/scrub previews.")
+    ap.add_argument("input", help="Input video file (e.g., input.mp4)")
+    ap.add_argument("outdir", help="Output directory")
+    add_preview_args(ap)
+    args = ap.parse_args()
+    check_preview_args(ap, args)
+    generate(args)
@@ -0,0 +1,45 @@
+from PIL import Image
+
+# Perceptual-hash deduplication of near-identical tiles.
+
+_dct = None
+
+def phash(img):
+    # 64-bit DCT perceptual hash: low 8x8 frequencies of a 32x32 luma copy vs their median
+    import numpy as np
+    global _dct
+    if _dct is None:
+        k = np.arange(32)
+        _dct = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / 64)
+    a = np.asarray(img.convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    low = (_dct @ a @ _dct.T)[:8, :8].ravel()
+    return int.from_bytes(np.packbits(low > np.median(low[1:])).tobytes(), "big")
+
+def popcount64(a):
+    import numpy as np
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(a)
+    return np.unpackbits(a.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def dedup_tiles(tiles, slots, threshold=2):
+    # Yield only tiles that are not near-duplicates (pHash Hamming distance <= threshold)
+    # of a tile kept earlier. slots[i] receives the index, among kept tiles, that input
+    # tile i is shown as; repeats point at the first occurrence.
+    import numpy as np
+    hashes = np.zeros(1024, dtype=np.uint64)
+    kept = 0
+    for t in tiles:
+        img = t if isinstance(t, Image.Image) else Image.open(t).convert("RGB")
+        h = np.uint64(phash(img))
+        if kept:
+            dist = popcount64(hashes[:kept] ^ h)
+            j = int(np.argmin(dist))
+            if dist[j] <= threshold:
+                slots.append(j)
+                continue
+        if kept == len(hashes):
+            hashes = np.concatenate([hashes, np.zeros_like(hashes)])
+        hashes[kept] = h
+        slots.append(kept)
+        kept += 1
+        yield img
@@ -0,0 +1,213 @@
+import bisect, heapq, os, shutil, subprocess, threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .runner import OutputTail, drain_stderr, in_context, iter_lines, kill_group, reap, run, spawn
+from .probe import ffprobe_keyframes
+
+# Frame extraction: fps filter, parallel segments, per-timestamp seeks, keyframe
+# snapping, raw rgb24 pipes and scene-change scoring.
+
+def tile_vf(tile_w, tile_h):
+    # Letterbox to exact tile size, keeping aspect ratio
+    return f"scale={tile_w}:{tile_h}:force_original_aspect_ratio=decrease,pad={tile_w}:{tile_h}:(ow-iw)/2:(oh-ih)/2:color=black"
+
+def extract_fps(inp, frames_dir, interval, tile_w, tile_h, progress=None):
+    # Single pass: decode every frame, keep one per interval
+    vf = f"fps=1/{interval},{tile_vf(tile_w, tile_h)}"
+    run([
+        "ffmpeg", "-y", "-i", str(inp),
+        "-vf", vf,
+        "-q:v", "5",
+        str(frames_dir / "thumb_%05d.jpg")
+    ], progress)
+
+def split_ranges(total, parts):
+    # Split [0, total) into up to `parts` contiguous (start, stop) ranges of near-equal size
+    parts = max(1, min(parts, total))
+    bounds = [total * i // parts for i in range(parts + 1)]
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+def decoder_threads(jobs):
+    # Share the cores between concurrent ffmpeg workers instead of oversubscribing them
+    return str(max(1, (os.cpu_count() or 1) // jobs))
+
+def extract_segmented(inp, frames_dir, interval, tile_w, tile_h, total_frames, jobs, start=0, progress=None):
+    # Split the timeline into `jobs` ranges, each decoded by its own ffmpeg process.
+    # Each worker numbers its output from its first global index, so thumb_%05d.jpg
+    # ends up as one sequence identical to the single-process run.
+    # `start` skips thumbnails that already exist (incremental runs).
+    vf = f"fps=1/{interval},{tile_vf(tile_w, tile_h)}"
+    threads = decoder_threads(jobs)
+
+    def worker(rng):
+        a, b = rng
+        run([
+            "ffmpeg", "-y", "-threads", threads,
+            "-ss", f"{a * interval:.6f}", "-i", str(inp),
+            "-t", f"{(b - a) * interval:.6f}",
+            "-vf", vf,
+            "-frames:v", str(b - a),
+            "-start_number", str(a + 1),
+            "-q:v", "5",
+            str(frames_dir / "thumb_%05d.jpg")
+        ], progress.part(a) if progress is not None else None)
+        return b - a
+
+    ranges = [(start + a, start + b) for a, b in split_ranges(total_frames - start, jobs)]
+    with ThreadPoolExecutor(max_workers=max(1, len(ranges))) as pool:
+        for (a, b), n in zip(ranges, pool.map(in_context(worker), ranges)):
+            print(f"  segment {a*interval:.1f}s-{b*interval:.1f}s: {n} frames")
+
+def extract_at_times(inp, frames_dir, times, tile_w, tile_h, keyframes_only=False, batch=32, jobs=1, start=0):
+    # Input-side seek per timestamp, so only the frames around each target are decoded.
+    # Several seeks share one ffmpeg process (one input per timestamp) to amortize startup.
+    # times[i] becomes thumb_{start+i+1:05d}.jpg
+    vf = tile_vf(tile_w, tile_h)
+    threads = decoder_threads(jobs)
+
+    def worker(b):
+        cmd = ["ffmpeg", "-y"]
+        for t in times[b:b+batch]:
+            if keyframes_only:
+                # Land on the keyframe at/before t and decode nothing else
+                cmd += ["-skip_frame", "nokey", "-noaccurate_seek"]
+            cmd += ["-threads", threads, "-ss", f"{t:.6f}", "-i", str(inp)]
+        for j in range(len(times[b:b+batch])):
+            cmd += [
+                "-map", f"{j}:v:0", "-frames:v", "1",
+                "-vf", vf, "-q:v", "5",
+                str(frames_dir / f"thumb_{start+b+j+1:05d}.jpg")
+            ]
+        run(cmd)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(in_context(worker), range(0, len(times), batch)))
+
+def snap_to_keyframes(targets, keyframes):
+    # Nearest keyframe for each target time
+    snapped = []
+    k = 0
+    for t in targets:
+        while k + 1 < len(keyframes) and abs(keyframes[k+1] - t) <= abs(keyframes[k] - t):
+            k += 1
+        snapped.append(keyframes[k])
+    return snapped
+
+def extract_keyframes(inp, frames_dir, targets, tile_w, tile_h, report_path, jobs=1):
+    keyframes = ffprobe_keyframes(inp)
+    if not keyframes:
+        raise RuntimeError(f"No keyframes found in {inp}")
+    snapped = snap_to_keyframes(targets, keyframes)
+
+    # Decode each distinct keyframe once; neighbours snapped to the same one reuse it
+    unique = sorted(set(snapped))
+    extract_at_times(inp, frames_dir, [kf + 0.0005 for kf in unique], tile_w, tile_h, keyframes_only=True, jobs=jobs)
+    for i, kf in reversed(list(enumerate(unique))):
+        (frames_dir / f"thumb_{i+1:05d}.jpg").rename(frames_dir / f"kf_{i+1:05d}.jpg")
+    slot = {kf: i for i, kf in enumerate(unique)}
+    for idx, kf in enumerate(snapped):
+        shutil.copyfile(frames_dir / f"kf_{slot[kf]+1:05d}.jpg", frames_dir / f"thumb_{idx+1:05d}.jpg")
+    for i in range(len(unique)):
+        (frames_dir / f"kf_{i+1:05d}.jpg").unlink()
+
+    # Report how far each thumbnail landed from its target time
+    offsets = [kf - t for t, kf in zip(targets, snapped)]
+    lines = ["index,target,keyframe,offset"]
+    for idx, (t, kf, off) in enumerate(zip(targets, snapped, offsets)):
+        lines.append(f"{idx},{t:.3f},{kf:.3f},{off:+.3f}")
+    report_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    abs_offsets = [abs(o) for o in offsets]
+    print(f"  {len(keyframes)} keyframes, {len(unique)} decoded | "
+          f"offset mean={sum(abs_offsets)/len(abs_offsets):.3f}s max={max(abs_offsets):.3f}s "
+          f"(see {report_path.name})")
+
+def iter_raw_frames(cmd, tile_w, tile_h, progress=None):
+    # Run an ffmpeg command that writes rgb24 frames to stdout and yield one tile per
+    # frame. Frames are read into a single reusable buffer; each yielded image is only
+    # valid until the next one is requested, so callers paste it right away.
+    from PIL import Image
+    frame_size = tile_w * tile_h * 3
+    buf = bytearray(frame_size)
+    view = memoryview(buf)
+    if progress is not None:
+        cmd = [cmd[0], "-progress", "pipe:2", "-nostats", *cmd[1:]]
+    p = spawn(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    # Drain stderr in the background (keeping only the tail) so ffmpeg never blocks on it
+    err_tail = OutputTail()
+    drain = threading.Thread(target=in_context(drain_stderr), args=(p.stderr, err_tail, progress), daemon=True)
+    drain.start()
+    try:
+        while True:
+            got = 0
+            while got < frame_size:
+                n = p.stdout.readinto(view[got:])
+                if not n:
+                    break
+                got += n
+            if got == 0:
+                break
+            if got < frame_size:
+                raise RuntimeError(f"Truncated frame from ffmpeg ({got} of {frame_size} bytes)")
+            yield Image.frombuffer("RGB", (tile_w, tile_h), buf, "raw", "RGB", 0, 1)
+        p.wait()  # stdout is done; let ffmpeg finish on its own
+    finally:
+        p.stdout.close()
+        kill_group(p, grace=0)
+        drain.join()
+        p.stderr.close()
+        reap(p)
+    if p.returncode != 0:
+        raise RuntimeError(f"Command failed:\n{' '.join(cmd)}\nSTDERR:\n{err_tail.text()}")
+
+def raw_frames_cmd(inp, interval, tile_w, tile_h, start=0):
+    vf = f"fps=1/{interval},{tile_vf(tile_w, tile_h)}"
+    seek = ["-ss", f"{start * interval:.6f}"] if start else []
+    return [
+        "ffmpeg", "-v", "error", *seek, "-i", str(inp),
+        "-vf", vf,
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-"
+    ]
+
+def scene_scores(inp, width=160, threshold=0.0):
+    # Scene-change score (0..1) as (pts seconds, score) of every frame scoring at least
+    # `threshold`, computed by ffmpeg's select filter on a downscaled copy to keep the
+    # per-frame cost low. Frames below it are dropped inside ffmpeg, and the printed
+    # metadata is parsed as it streams in.
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", str(inp), "-an",
+        "-vf", f"scale={width}:-2,select='gte(scene,{threshold:g})',metadata=print:key=lavfi.scene_score:file=-",
+        "-f", "null", "-"
+    ]
+    scores = []
+    t = None
+    for line in iter_lines(cmd):
+        if line.startswith("frame:"):
+            t = float(line.rsplit("pts_time:", 1)[1])
+        elif line.startswith("lavfi.scene_score=") and t is not None:
+            scores.append((t, float(line.partition("=")[2])))
+    return scores
+
+def pick_scene_times(scores, budget, threshold, min_gap, duration=None):
+    # Spend up to `budget` tiles on the strongest scene changes (score >= threshold),
+    # keeping them at least min_gap seconds apart. The start always gets a tile.
+    chosen = [0.0]
+    for t, score in sorted(scores, key=lambda ts: -ts[1]):
+        if len(chosen) >= budget or score < threshold:
+            break
+        i = bisect.bisect_left(chosen, t)
+        if (i > 0 and t - chosen[i - 1] < min_gap) or (i < len(chosen) and chosen[i] - t < min_gap):
+            continue
+        chosen.insert(i, t)
+    if duration:
+        # Footage with few cuts leaves budget over: split the longest cue in half until
+        # the budget is spent or halving would break min_gap
+        gaps = [(a - b, a) for a, b in zip(chosen, chosen[1:] + [duration])]
+        heapq.heapify(gaps)
+        while len(chosen) < budget and gaps and -gaps[0][0] / 2 >= max(min_gap, 0.001):
+            length, start = heapq.heappop(gaps)
+            half = length / 2
+            mid = start - half
+            bisect.insort(chosen, mid)
+            heapq.heappush(gaps, (half, start))
+            heapq.heappush(gaps, (half, mid))
+    return chosen
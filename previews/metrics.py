@@ -0,0 +1,164 @@
+import json, os, resource, socket, threading, time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: only runs within one process are serialized
+    fcntl = None
+
+from .vtt import hhmmss_ms
+
+# Stage spans, ffmpeg progress lines and the Prometheus textfile writer.
+
+class Progress:
+    # Folds ffmpeg -progress reports from one or more parallel parts into a throttled
+    # "label: percent | frames | speed | ETA" line plus metrics events. `total` is the
+    # media seconds all parts cover together; each part counts its own out_time from 0.
+
+    def __init__(self, label, total, metrics=None, every=2.0):
+        self.label, self.total, self.metrics, self.every = label, total, metrics, every
+        self.done, self.frames = {}, {}
+        self.started = time.perf_counter()
+        self.shown = self.started
+        self.lock = threading.Lock()
+
+    def part(self, idx):
+        return lambda state: self.update(state, idx)
+
+    def __call__(self, state):
+        self.update(state)
+
+    def update(self, state, idx=0):
+        with self.lock:
+            try:
+                self.done[idx] = max(0.0, int(state.get("out_time_us") or state.get("out_time_ms")) / 1e6)
+            except (TypeError, ValueError):
+                pass  # N/A before the first frame
+            self.frames[idx] = int(state.get("frame") or self.frames.get(idx, 0))
+            now = time.perf_counter()
+            if now - self.shown < self.every and state.get("progress") != "end":
+                return
+            self.shown = now
+            done = min(self.total, sum(self.done.values())) if self.total else sum(self.done.values())
+            frames = sum(self.frames.values())
+        elapsed = max(now - self.started, 1e-9)
+        speed = done / elapsed
+        eta = (self.total - done) / speed if speed > 0 and self.total else None
+        pct = 100.0 * done / self.total if self.total else 0.0
+        print(f"  {self.label}: {pct:5.1f}% | {frames} frames ({frames / elapsed:.1f}/s) | {speed:.1f}x"
+              + (f" | ETA {hhmmss_ms(eta)[:8]}" if eta is not None else ""))
+        if self.metrics is not None:
+            self.metrics.event("progress", stage=self.label, percent=round(pct, 2), frames=frames,
+                               frames_per_s=round(frames / elapsed, 3), speed=round(speed, 3),
+                               eta_s=None if eta is None else round(eta, 3))
+
+def io_bytes():
+    # Bytes read and written through read()/write() calls, page cache hits included, by
+    # this process and its reaped children; block I/O that reached storage where
+    # /proc/self/io is missing
+    try:
+        with open("/proc/self/io", encoding="ascii") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        me, kids = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        return (me.ru_inblock + kids.ru_inblock) * 512, (me.ru_oublock + kids.ru_oublock) * 512
+
+class Metrics:
+    # Stage spans for one generate() run. lap(stage) closes the stage that ran since the
+    # previous lap: wall time is the stage's own, CPU time and bytes read/written (see
+    # io_bytes) are process-wide deltas including finished ffmpeg children,
+    # so background work (copy, web video, packaging) shows up in whichever stage
+    # overlaps it. Those background stages also get spans of their own via add().
+
+    def __init__(self, jsonl=None, **labels):
+        self.jsonl = jsonl
+        self.labels = {"host": socket.gethostname(), "pid": os.getpid(), **labels}
+        self.spans = {}
+        self.lock = threading.Lock()
+        self.mark = self.sample()
+
+    @staticmethod
+    def sample():
+        me, kids = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        return (time.perf_counter(), me.ru_utime + me.ru_stime + kids.ru_utime + kids.ru_stime, *io_bytes())
+
+    def lap(self, stage):
+        now = self.sample()
+        wall, cpu, read, written = (a - b for a, b in zip(now, self.mark))
+        self.mark = now
+        self.add(stage, wall, cpu, read, written)
+
+    def add(self, stage, wall, cpu=0.0, read=0, written=0):
+        with self.lock:
+            span = self.spans.setdefault(stage, {"wall_s": 0.0, "cpu_s": 0.0, "read_bytes": 0, "write_bytes": 0})
+            span["wall_s"] += wall
+            span["cpu_s"] += cpu
+            span["read_bytes"] += read
+            span["write_bytes"] += written
+        self.event("span", stage=stage, wall_s=round(wall, 6), cpu_s=round(cpu, 6), read_bytes=read, write_bytes=written)
+
+    def timings(self):
+        with self.lock:
+            return {stage: span["wall_s"] for stage, span in self.spans.items()}
+
+    def event(self, kind, **fields):
+        if self.jsonl is None:
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "event": kind, **self.labels, **fields})
+        with _metrics_lock, open(self.jsonl, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+_metrics_lock = threading.Lock()
+
+def read_prom_totals(path):
+    # Counters (*_total series) currently in a textfile written by write_prom()
+    totals = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            name, _, value = line.rpartition(" ")
+            if not line.startswith("#") and name.split("{")[0].endswith("_total"):
+                totals[name] = float(value)
+    return totals
+
+def write_prom(path, metrics, stats):
+    # Prometheus text exposition (e.g. for node_exporter's textfile collector): counters
+    # summed over every run that wrote this file, plus gauges for the latest run. The
+    # file is re-read on every write while holding an flock on a .lock file next to it,
+    # so the processes of a fleet can share one textfile without losing each other's runs.
+    path = Path(path)
+    with _metrics_lock, open(path.with_name(f".{path.name}.lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        totals = read_prom_totals(path)
+        counters = {
+            "preview_runs_total": 1,
+            "preview_frames_total": stats["frames"],
+            "preview_sheets_total": stats["sheets"],
+        }
+        for stage, span in metrics.spans.items():
+            counters[f'preview_stage_seconds_total{{stage="{stage}"}}'] = span["wall_s"]
+            counters[f'preview_stage_cpu_seconds_total{{stage="{stage}"}}'] = span["cpu_s"]
+            counters[f'preview_stage_read_bytes_total{{stage="{stage}"}}'] = span["read_bytes"]
+            counters[f'preview_stage_write_bytes_total{{stage="{stage}"}}'] = span["write_bytes"]
+        for name, value in counters.items():
+            totals[name] = totals.get(name, 0) + value
+        wall = sum(span["wall_s"] for stage, span in metrics.spans.items() if stage not in BACKGROUND_STAGES)
+        gauges = {
+            "preview_last_run_seconds": wall,
+            "preview_last_run_frames_per_second": stats["frames"] / wall if wall else 0.0,
+            "preview_last_run_timestamp_seconds": time.time(),
+        }
+        lines = []
+        for name in sorted(totals, key=lambda n: (n.split("{")[0], n)):
+            family = name.split("{")[0]
+            if not lines or lines[-1].split(" ")[0].split("{")[0] != family:
+                lines.append(f"# TYPE {family} counter")
+            lines.append(f"{name} {totals[name]:.15g}")
+        for name, value in gauges.items():
+            lines += [f"# TYPE {name} gauge", f"{name} {value:.15g}"]
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+
+BACKGROUND_STAGES = {"copy", "web_video", "package", "encode"}  # overlap the foreground stages
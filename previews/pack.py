@@ -0,0 +1,107 @@
+import io, math
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from .extract import iter_raw_frames, tile_vf
+from .runner import in_context
+from .sprite import PIL_FORMATS, compose_sheet, sprite_save_kwargs
+
+# Sprite packing: encode a sheet of a few sample tiles to find the cheapest format and
+# quality that stays above an SSIM threshold, then pick the grid that keeps every sheet
+# within a byte budget without leaving the last one mostly empty.
+
+SAMPLE_TILES = 12          # decoded at evenly spaced times, laid out 4x3
+SHEET_MAX_SIDE = 4096      # px; larger canvases decode slowly or not at all on phones
+QUALITIES = list(range(30, 96, 5))
+AUTO_FORMATS = ["webp", "jpg"]
+
+def sample_tiles(inp, duration, tile_w, tile_h, count=SAMPLE_TILES, jobs=4):
+    # One input-side seek per sample, letterboxed like the real tiles
+    def grab(t):
+        cmd = ["ffmpeg", "-v", "error", "-ss", f"{t:.6f}", "-i", str(inp), "-frames:v", "1",
+               "-vf", tile_vf(tile_w, tile_h), "-f", "rawvideo", "-pix_fmt", "rgb24", "-"]
+        return [img.copy() for img in iter_raw_frames(cmd, tile_w, tile_h)]
+
+    times = [duration * (i + 0.5) / count for i in range(count)]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return [img for imgs in pool.map(in_context(grab), times) for img in imgs]
+
+def ssim(a, b, win=7):
+    # Mean SSIM of the luma of two equally sized images over win x win box windows
+    import numpy as np
+    x = np.asarray(a.convert("L"), dtype=np.float64)
+    y = np.asarray(b.convert("L"), dtype=np.float64)
+
+    def box(m):
+        c = np.pad(m, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+        return (c[win:, win:] - c[:-win, win:] - c[win:, :-win] + c[:-win, :-win]) / (win * win)
+
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = box(x), box(y)
+    vx, vy, cov = box(x * x) - mx * mx, box(y * y) - my * my, box(x * y) - mx * my
+    s = ((2 * mx * my + c1) * (2 * cov + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+    return float(s.mean())
+
+def encode_sheet(sheet, fmt, quality=None):
+    # Bytes save_sprite() would write for this sheet
+    buf = io.BytesIO()
+    sheet.save(buf, format=PIL_FORMATS[fmt], **sprite_save_kwargs(fmt, quality))
+    return buf.getvalue()
+
+def search_quality(sheet, fmt, threshold):
+    # Binary search over QUALITIES for the lowest quality whose SSIM reaches the
+    # threshold (the highest one if none does); returns (quality, bytes, ssim)
+    found = None
+    lo, hi = 0, len(QUALITIES) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        data = encode_sheet(sheet, fmt, QUALITIES[mid])
+        score = ssim(sheet, Image.open(io.BytesIO(data)))
+        if score >= threshold:
+            found = (QUALITIES[mid], len(data), score)
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    if found is None:
+        data = encode_sheet(sheet, fmt, QUALITIES[-1])
+        found = (QUALITIES[-1], len(data), ssim(sheet, Image.open(io.BytesIO(data))))
+    return found
+
+def choose_grid(total, tile_w, tile_h, tile_bytes, sheet_bytes, max_side=SHEET_MAX_SIDE):
+    # Fewest sheets whose slots stay within the byte budget and canvas limit; among
+    # those, sheets whose last one is at least half full, then the squarest canvas,
+    # then the fewest empty slots
+    max_cols, max_rows = max(1, max_side // tile_w), max(1, max_side // tile_h)
+    cap = max(1, min(int(sheet_bytes // max(tile_bytes, 1)), max_cols * max_rows))
+    best = None
+    for cols in range(1, min(max_cols, total, cap) + 1):
+        rows = min(max_rows, cap // cols, math.ceil(total / cols))
+        slots = cols * rows
+        sheets = math.ceil(total / slots)
+        empty = sheets * slots - total
+        key = (sheets, empty * 2 > slots, abs(math.log(cols * tile_w / (rows * tile_h))), empty)
+        if best is None or key < best[0]:
+            best = (key, cols, rows)
+    return best[1], best[2]
+
+def plan_sprites(inp, duration, total_frames, tile_w, tile_h, fmt, quality, grid, threshold, sheet_bytes):
+    # Resolve "auto" format/quality/grid from a sample sheet. fmt is a format or
+    # "auto" (webp or jpg), quality an int, None (format default) or "auto", grid
+    # "CxR" or "auto". Returns a dict with the resolved cols, rows, format and quality,
+    # plus the sample's ssim and bytes per tile.
+    tiles = sample_tiles(inp, duration, tile_w, tile_h, min(SAMPLE_TILES, max(1, total_frames)))
+    sheet = compose_sheet(tiles, 4, 3, tile_w, tile_h)
+    if fmt == "auto" or quality == "auto":
+        candidates = [(f, *search_quality(sheet, f, threshold)) for f in (AUTO_FORMATS if fmt == "auto" else [fmt])]
+        # Smallest that meets the threshold; the best-scoring one if none does
+        passing = [c for c in candidates if c[3] >= threshold]
+        fmt, quality, size, score = min(passing, key=lambda c: c[2]) if passing else max(candidates, key=lambda c: c[3])
+    else:
+        data = encode_sheet(sheet, fmt, quality)
+        size, score = len(data), ssim(sheet, Image.open(io.BytesIO(data)))
+    tile_bytes = size / max(1, len(tiles))
+    if grid.lower() == "auto":
+        cols, rows = choose_grid(total_frames, tile_w, tile_h, tile_bytes, sheet_bytes)
+    else:
+        cols, rows = map(int, grid.lower().split("x"))
+    return {"cols": cols, "rows": rows, "format": fmt, "quality": quality, "ssim": score, "tile_bytes": tile_bytes}
@@ -0,0 +1,131 @@
+import os, shutil
+
+from .runner import run
+
+# Placing the source video next to the previews: reflink, hardlink, copy or a web MP4.
+
+def place_file(src, dest):
+    # Skip the copy when dest already holds this exact file (same size and mtime)
+    if dest.exists():
+        a, b = src.stat(), dest.stat()
+        if a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns:
+            return False
+    shutil.copy2(src, dest)
+    return True
+
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+def reflink(src, dest):
+    # Copy-on-write clone (btrfs, XFS, bcachefs...); raises OSError where unsupported
+    import fcntl
+    with open(src, "rb") as fi, open(dest, "wb") as fo:
+        try:
+            fcntl.ioctl(fo.fileno(), FICLONE, fi.fileno())
+        except OSError:
+            fo.close()
+            os.unlink(dest)
+            raise
+    shutil.copystat(src, dest)
+
+def fast_copy(src, dest):
+    # In-kernel copy (copy_file_range, then sendfile) so the bytes never pass through Python
+    with open(src, "rb") as fi, open(dest, "wb") as fo:
+        infd, outfd = fi.fileno(), fo.fileno()
+        size = os.fstat(infd).st_size
+        offset = 0
+        for op in ("copy_file_range", "sendfile"):
+            if not hasattr(os, op):
+                continue
+            try:
+                os.lseek(outfd, offset, os.SEEK_SET)
+                while offset < size:
+                    if op == "copy_file_range":
+                        n = os.copy_file_range(infd, outfd, size - offset, offset, offset)
+                    else:
+                        n = os.sendfile(outfd, infd, offset, size - offset)
+                    if n == 0:
+                        break
+                    offset += n
+                break
+            except OSError:
+                continue
+        if offset < size:
+            fi.seek(offset)
+            fo.seek(offset)
+            shutil.copyfileobj(fi, fo, 1 << 20)
+    shutil.copystat(src, dest)
+
+LINK_MODES = {
+    "reflink": reflink,
+    "hardlink": os.link,
+    "symlink": os.symlink,
+    "copy": fast_copy,
+}
+
+def place_video(src, dest, mode="auto"):
+    # Put the source video into outdir as cheaply as allowed; returns the mode used.
+    # auto tries reflink, then hardlink, then falls back to a copy.
+    if dest.exists() or dest.is_symlink():
+        if dest.exists() and os.path.samefile(src, dest):
+            return "existing"
+        a, b = src.stat(), dest.stat()
+        if mode in ("auto", "copy", "reflink") and a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns:
+            return "existing"
+        dest.unlink()
+    for m in (["reflink", "hardlink", "copy"] if mode == "auto" else [mode]):
+        try:
+            LINK_MODES[m](src, dest)
+            return m
+        except OSError:
+            if mode != "auto":
+                raise
+    raise RuntimeError(f"Could not place {src} at {dest}")
+
+BROWSER_VIDEO = {"h264"}
+BROWSER_AUDIO = {"", "aac", "mp3"}  # "" = no audio stream
+BROWSER_PIX_FMT = {"yuv420p", "yuvj420p"}
+
+def browser_safe(media):
+    # Streams every browser can play from an MP4, so a remux is enough
+    return (media.video_codec in BROWSER_VIDEO and media.pix_fmt in BROWSER_PIX_FMT
+            and media.audio_codec in BROWSER_AUDIO)
+
+def remux_cmd(inp, dest):
+    # Same streams, MP4 container with the moov atom up front
+    return ["ffmpeg", "-y", "-v", "error", "-i", str(inp), "-map", "0:v:0", "-map", "0:a:0?",
+            "-c", "copy", "-movflags", "+faststart", "-f", "mp4", str(dest)]
+
+def transcode_cmd(inp, dest, target_width=1280, bitrate="1800k"):
+    # H.264/AAC with a fixed 48-frame GOP (no scenecut keyframes) so seeks land quickly;
+    # CRF quality, capped at the given bitrate
+    return [
+        "ffmpeg", "-y", "-v", "error", "-i", str(inp), "-map", "0:v:0", "-map", "0:a:0?",
+        "-vf", f"scale='min({target_width},iw)':-2",
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "high", "-crf", "23", "-pix_fmt", "yuv420p",
+        "-x264-params", "keyint=48:min-keyint=48:scenecut=0",
+        "-maxrate", bitrate, "-bufsize", bitrate,
+        "-movflags", "+faststart",
+        "-c:a", "aac", "-b:a", "128k",
+        "-f", "mp4", str(dest)
+    ]
+
+def web_video(inp, dest, media, mode="auto", target_width=1280, bitrate="1800k", progress=None):
+    # Write a browser-friendly MP4 (faststart, short GOP when transcoded) to dest;
+    # returns what was done. auto remuxes browser-safe inputs and transcodes the rest.
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+    if mode == "auto":
+        mode = "remux" if browser_safe(media) else "transcode"
+    try:
+        if mode == "remux":
+            try:
+                run(remux_cmd(inp, tmp))
+            except RuntimeError:
+                print("Remux failed; falling back to transcode.")
+                mode = "transcode"
+        if mode == "transcode":
+            run(transcode_cmd(inp, tmp, target_width, bitrate), progress)
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return mode
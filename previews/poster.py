@@ -0,0 +1,45 @@
+
+from .runner import run
+
+# thumbnail.jpg: the midpoint frame or the sharpest tile near the middle.
+
+def sharpness(img):
+    # Variance of the Laplacian: higher means more in-focus detail
+    from PIL import ImageFilter, ImageStat
+    lap = img.convert("L").filter(ImageFilter.Kernel((3, 3), [0, 1, 0, 1, -4, 1, 0, 1, 0], scale=1, offset=128))
+    return ImageStat.Stat(lap).var[0]
+
+def pick_poster_tile(outdir, sprite_files, sample_times, duration, cols, per_sheet, tile_w, tile_h, candidates=1, slots=None):
+    # Choose among the K tiles nearest the middle of the video (the sharpest one when
+    # K > 1) using the sprite sheets already on disk. sample_times[i] is the time tile i
+    # was taken from; slots[i] is where it sits in the sheets after dedup, if any.
+    # Returns (tile index, sample time).
+    from PIL import Image
+    total_frames = len(sample_times)
+    sample_time = lambda idx: sample_times[idx]
+    mid = min(range(total_frames), key=lambda idx: abs(sample_time(idx) - duration / 2))
+    first = max(0, min(mid - candidates // 2, total_frames - candidates))
+    indices = range(first, min(total_frames, first + candidates))
+    if len(indices) <= 1:
+        return mid, sample_time(mid)
+    sheets = {}
+    scores = {}
+    for idx in indices:
+        sheet, pos = divmod(slots[idx] if slots is not None else idx, per_sheet)
+        if sheet not in sheets:
+            sheets[sheet] = Image.open(outdir / sprite_files[sheet]).convert("RGB")
+        x, y = (pos % cols) * tile_w, (pos // cols) * tile_h
+        scores[idx] = sharpness(sheets[sheet].crop((x, y, x + tile_w, y + tile_h)))
+    best = max(indices, key=lambda idx: (scores[idx], -abs(idx - mid)))
+    return best, sample_time(best)
+
+def extract_poster(inp, t, dest):
+    # Input-side seek: decode from the keyframe before t, not from the start of the file
+    run([
+        "ffmpeg", "-y",
+        "-ss", f"{t:.6f}",
+        "-i", str(inp),
+        "-frames:v", "1",  # Capture only one frame
+        "-q:v", "2",  # High quality
+        str(dest)
+    ])
@@ -0,0 +1,98 @@
+import json, threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .runner import iter_lines, run
+from .cache import fingerprint
+
+# One ffprobe pass per input for duration, codecs, size and frame rate, plus a streamed
+# packet scan for the keyframe index when a stage needs it.
+
+@dataclass
+class MediaInfo:
+    # Everything the pipeline needs to know about an input, from one ffprobe call
+    path: str
+    duration: float
+    size: int
+    format_name: str
+    bit_rate: int = 0
+    video_codec: str = ""
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    pix_fmt: str = ""
+    audio_codec: str = ""
+    start_time: float = 0.0
+    keyframes: list = field(default=None, repr=False)  # keyframe pts (s) of the video stream, if indexed
+
+def _rate(r):
+    num, _, den = (r or "0/1").partition("/")
+    return float(num) / float(den or 1) if float(den or 1) else 0.0
+
+MEDIA_INFO_ENTRIES = 256  # inputs remembered by long-lived processes (batch, server)
+_media_info = OrderedDict()
+_media_lock = threading.Lock()
+
+def probe_keyframes(path):
+    # Keyframe pts (s) of the first video stream: its packets are listed (demux only,
+    # no decode) one compact line each and parsed as ffprobe writes them
+    cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+           "-show_entries", "packet=pts_time,flags", "-of", "compact=p=0", str(path)]
+    keyframes = set()
+    for line in iter_lines(cmd):
+        pkt = dict(part.partition("=")[::2] for part in line.split("|"))
+        if "K" in pkt.get("flags", "") and pkt.get("pts_time") not in (None, "", "N/A"):
+            keyframes.add(float(pkt["pts_time"]))
+    return sorted(keyframes)
+
+def probe_media(path, keyframes=False):
+    # Single ffprobe (JSON) per input fingerprint, memoized for every later stage.
+    # keyframes=True adds the keyframe index used by the seek/keyframe/parallel
+    # extraction modes and thumbnail().
+    path = Path(path)
+    key = fingerprint(path)
+    with _media_lock:
+        info = _media_info.get(key)
+        if info is not None:
+            _media_info.move_to_end(key)
+    if info is not None and (info.keyframes is not None or not keyframes):
+        return info
+    if info is None:
+        info = _probe_info(path)
+    if keyframes:
+        info.keyframes = probe_keyframes(path)
+    with _media_lock:
+        _media_info[key] = info
+        while len(_media_info) > MEDIA_INFO_ENTRIES:
+            _media_info.popitem(last=False)
+    return info
+
+def _probe_info(path):
+    data = json.loads(run(["ffprobe", "-v", "error", "-of", "json", "-show_format", "-show_streams", str(path)]))
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    video = next((st for st in streams if st.get("codec_type") == "video"), {})
+    audio = next((st for st in streams if st.get("codec_type") == "audio"), {})
+    duration = float(fmt.get("duration") or video.get("duration") or 0.0)
+    return MediaInfo(
+        path=str(path),
+        duration=duration,
+        size=int(fmt.get("size") or path.stat().st_size),
+        format_name=fmt.get("format_name", ""),
+        bit_rate=int(fmt.get("bit_rate") or 0),
+        video_codec=video.get("codec_name", ""),
+        width=int(video.get("width") or 0),
+        height=int(video.get("height") or 0),
+        fps=_rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")),
+        pix_fmt=video.get("pix_fmt", ""),
+        audio_codec=audio.get("codec_name", ""),
+        start_time=float(fmt.get("start_time") or 0.0),
+    )
+
+def ffprobe_duration(path):
+    return probe_media(path).duration
+
+def ffprobe_keyframes(path):
+    # Keyframe pts (seconds) of the first video stream, from the memoized keyframe index
+    return probe_media(path, keyframes=True).keyframes
@@ -0,0 +1,201 @@
+import contextvars, os, signal, subprocess, threading, time
+from collections import deque
+
+# Child processes: run() and the raw pieces it is built from. Every child gets its own
+# process group so a timeout, a cancel event or cancel_all() can stop the whole tree.
+
+RUN_TAIL_BYTES = 64 << 10  # stderr kept per child for error reports
+KILL_GRACE = 2.0           # seconds between SIGTERM and SIGKILL
+
+class OutputTail:
+    # Ring buffer of the last `limit` bytes a child wrote; older output is dropped
+
+    def __init__(self, limit=RUN_TAIL_BYTES):
+        self.limit = limit
+        self.chunks = deque()
+        self.size = 0
+
+    def append(self, data):
+        self.chunks.append(data)
+        self.size += len(data)
+        while self.size - len(self.chunks[0]) >= self.limit:
+            self.size -= len(self.chunks.popleft())
+
+    def text(self):
+        return b"".join(self.chunks)[-self.limit:].decode(errors="replace")
+
+def in_context(fn):
+    # fn bound to the caller's contextvars and cancel scope, for handing to another
+    # thread. Threads start with an empty context and no cancel_scope.event, so per-job
+    # state (such as batch_previews' log routing) and cancellation would not reach the
+    # drainers and workers a stage starts. Each call runs in its own context copy, so
+    # pool workers can run it concurrently.
+    ctx = contextvars.copy_context()
+    event = getattr(cancel_scope, "event", None)
+
+    def call(*args, **kwargs):
+        outer = getattr(cancel_scope, "event", None)
+        cancel_scope.event = event
+        try:
+            return ctx.copy().run(fn, *args, **kwargs)
+        finally:
+            cancel_scope.event = outer
+    return call
+
+_children = set()
+_children_lock = threading.Lock()
+
+def spawn(cmd, **kwargs):
+    # Popen in a new process group (session), tracked so cancel_all() can stop it
+    if os.name == "nt":
+        kwargs.setdefault("creationflags", subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        kwargs.setdefault("start_new_session", True)
+    p = subprocess.Popen(cmd, **kwargs)
+    with _children_lock:
+        _children.add(p)
+    return p
+
+def reap(p):
+    p.wait()
+    with _children_lock:
+        _children.discard(p)
+
+def kill_group(p, grace=KILL_GRACE):
+    # SIGTERM the child's whole process group, SIGKILL whatever is left after `grace`
+    if p.poll() is not None:
+        return
+    if os.name == "nt":
+        p.kill()
+        return
+    for sig, wait in ((signal.SIGTERM, grace), (signal.SIGKILL, None)):
+        try:
+            os.killpg(p.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            return
+        try:
+            p.wait(wait)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+
+def cancel_all():
+    # Stop every child started through spawn() (e.g. from a signal handler or a server)
+    with _children_lock:
+        running = list(_children)
+    for p in running:
+        kill_group(p)
+
+# cancel_scope.event, when set on a thread, is the default `cancel` of every run() on
+# it, so whole stages (poster, web video, packaging) can be stopped from outside
+cancel_scope = threading.local()
+
+def run(cmd, progress=None, timeout=None, cancel=None):
+    # Run a command in its own process group; returns its stdout (stripped text).
+    # stderr is streamed as it is written and only the last RUN_TAIL_BYTES are kept
+    # for the error report. With progress (a callable, see Progress) ffmpeg reports
+    # progress on stderr while it runs. The group is killed on timeout (seconds), when
+    # the `cancel` event is set, or if the caller is interrupted.
+    if cancel is None:
+        cancel = getattr(cancel_scope, "event", None)
+    if progress is not None:
+        cmd = [cmd[0], "-progress", "pipe:2", "-nostats", *cmd[1:]]
+    p = spawn(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    out = []
+    tail = OutputTail()
+    readers = [threading.Thread(target=lambda: out.append(p.stdout.read()), daemon=True),
+               threading.Thread(target=in_context(drain_stderr), args=(p.stderr, tail, progress), daemon=True)]
+    for r in readers:
+        r.start()
+    deadline = time.monotonic() + timeout if timeout else None
+    reason = None
+    try:
+        while p.poll() is None:
+            if cancel is not None and cancel.is_set():
+                reason = "cancelled"
+            elif deadline is not None and time.monotonic() > deadline:
+                reason = f"timed out after {timeout:g}s"
+            if reason:
+                kill_group(p)
+                break
+            try:
+                p.wait(0.2)
+            except subprocess.TimeoutExpired:
+                pass
+    except BaseException:
+        kill_group(p)
+        raise
+    finally:
+        for r in readers:
+            r.join()
+        p.stdout.close()
+        p.stderr.close()
+        reap(p)
+    if reason:
+        raise RuntimeError(f"Command {reason}:\n{' '.join(cmd)}\nSTDERR:\n{tail.text()}")
+    if p.returncode != 0:
+        raise RuntimeError(f"Command failed:\n{' '.join(cmd)}\nSTDERR:\n{tail.text()}")
+    return out[0].decode(errors="replace").strip()
+
+def iter_lines(cmd, cancel=None):
+    # Run a command in its own process group and yield its stdout line by line (text,
+    # newline stripped) as it is written, so long outputs are parsed without holding
+    # them in memory. stderr is kept as in run(). The group is killed if the caller
+    # stops early or fails, or when `cancel` is set.
+    if cancel is None:
+        cancel = getattr(cancel_scope, "event", None)
+    p = spawn(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    tail = OutputTail()
+    drain = threading.Thread(target=in_context(drain_stderr), args=(p.stderr, tail), daemon=True)
+    drain.start()
+    cancelled = False
+    try:
+        for line in p.stdout:
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+                break
+            yield line.decode(errors="replace").rstrip("\r\n")
+        if not cancelled:
+            p.wait()  # stdout is done; let the command finish on its own
+    finally:
+        p.stdout.close()
+        kill_group(p, grace=0)
+        drain.join()
+        p.stderr.close()
+        reap(p)
+    if cancelled:
+        raise RuntimeError(f"Command cancelled:\n{' '.join(cmd)}\nSTDERR:\n{tail.text()}")
+    if p.returncode != 0:
+        raise RuntimeError(f"Command failed:\n{' '.join(cmd)}\nSTDERR:\n{tail.text()}")
+
+PROGRESS_KEYS = {"frame", "fps", "bitrate", "total_size", "out_time_us", "out_time_ms", "out_time",
+                 "dup_frames", "drop_frames", "speed", "progress"}
+
+def drain_stderr(stream, tail, progress=None):
+    # Copy a child's stderr into `tail` (an OutputTail) in chunks as it arrives, so
+    # "\r"-separated stats lines never pile up. With progress, the key=value blocks
+    # written by -progress are parsed out and handed over at each "progress=" line.
+    state = {}
+    pending = b""
+    while True:
+        chunk = stream.read1(1 << 16)
+        if not chunk:
+            break
+        if progress is None:
+            tail.append(chunk)
+            continue
+        *lines, pending = (pending + chunk).replace(b"\r", b"\n").split(b"\n")
+        for line in lines:
+            key, sep, value = line.decode(errors="replace").strip().partition("=")
+            if sep and (key in PROGRESS_KEYS or key.startswith("stream_")):
+                state[key] = value
+                if key == "progress":
+                    progress(state)
+                    state = {}
+            elif line:
+                tail.append(line + b"\n")
+        if len(pending) > tail.limit:
+            tail.append(pending)
+            pending = b""
+    if pending:
+        tail.append(pending)
@@ -0,0 +1,228 @@
+import math, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from .runner import in_context, run
+from .extract import decoder_threads, split_ranges, tile_vf
+
+# Sprite sheet composition and encoding (PIL), size ladders and the ffmpeg tile engine.
+
+DEFAULT_QUALITY = {"webp": 80, "jpg": 85, "jpeg": 85}
+PIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG", "jpeg": "JPEG", "png": "PNG"}
+
+def sprite_save_kwargs(fmt, quality=None):
+    # PIL encoder settings; quality=None keeps the format's default
+    if fmt == "webp":
+        return {"method": 6, "quality": quality or DEFAULT_QUALITY[fmt]}
+    if fmt in ("jpg","jpeg"):
+        return {"quality": quality or DEFAULT_QUALITY[fmt]}
+    return {}
+
+def save_sprite(sprite, sprite_path, fmt, quality=None):
+    sprite.save(sprite_path, **sprite_save_kwargs(fmt, quality))
+
+def paste_tile(sprite, t, i, cols, tile_w, tile_h):
+    # Tile i (row-major) of a sheet; t is an image or a frame file path
+    img = t if isinstance(t, Image.Image) else Image.open(t).convert("RGB")
+    r = i // cols
+    c = i % cols
+    sprite.paste(img, (c*tile_w, r*tile_h))
+
+def compose_sheet(tiles, cols, rows, tile_w, tile_h, base=None, offset=0):
+    # Tiles are images or frame file paths (decoded here, i.e. on the worker).
+    # `base` is an existing partially filled sheet to continue from slot `offset`.
+    if base is not None:
+        sprite = Image.open(base).convert("RGB")
+    else:
+        sprite = Image.new("RGB", (cols*tile_w, rows*tile_h), (0,0,0))
+    for i, t in enumerate(tiles, offset):
+        paste_tile(sprite, t, i, cols, tile_w, tile_h)
+    return sprite
+
+class SpriteWriter:
+    # Push-style sprite assembly: add() tiles row-major into cols x rows sheets, each full
+    # sheet is encoded as it completes. With one worker every tile is pasted into the
+    # current sheet as it arrives; with a pool, tiles are collected per sheet and composed
+    # and encoded on the pool (PIL releases the GIL while encoding, and at most
+    # workers+1 sheets are in flight to bound memory).
+    # close() flushes and returns the names of the sheets written, in sheet order.
+    # `start` is the global index of the first tile; a partially filled sheet on disk
+    # is completed in place and earlier sheets are left untouched.
+
+    def __init__(self, outdir, cols, rows, tile_w, tile_h, fmt, workers=1, start=0, sprite_pattern=None, quality=None):
+        self.outdir, self.cols, self.rows, self.tile_w, self.tile_h = outdir, cols, rows, tile_w, tile_h
+        self.fmt, self.quality, self.workers = fmt, quality, workers
+        self.sprite_pattern = sprite_pattern or f"sprite_%d.{fmt}"
+        self.per_sheet = cols * rows
+        self.sprite_files = []
+        self.pending = deque()
+        self.chunk = []
+        self.sheet, self.pasted = None, 0  # current sheet when there is no pool
+        self.sheet_idx, self.offset = divmod(start, self.per_sheet)
+        self.pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.started = time.perf_counter()
+        self.encode_seconds = 0.0  # summed over sheets, so it can exceed wall time with workers
+
+    def build(self, sheet_idx, chunk, offset):
+        base = self.outdir / (self.sprite_pattern % sheet_idx) if offset else None
+        sprite = compose_sheet(chunk, self.cols, self.rows, self.tile_w, self.tile_h, base, offset)
+        return self.encode(sheet_idx, sprite, offset + len(chunk))
+
+    def encode(self, sheet_idx, sprite, n):
+        sprite_name = self.sprite_pattern % sheet_idx
+        started = time.perf_counter()
+        save_sprite(sprite, self.outdir / sprite_name, self.fmt, self.quality)
+        return sprite_name, n, time.perf_counter() - started
+
+    def collect(self, result):
+        sprite_name, n, encode_seconds = result
+        self.encode_seconds += encode_seconds
+        self.sprite_files.append(sprite_name)
+        print(f"  wrote {sprite_name} ({n} tiles)")
+
+    def submit(self):
+        if self.pool is None:
+            self.collect(self.encode(self.sheet_idx, self.sheet, self.offset + self.pasted))
+        else:
+            self.pending.append(self.pool.submit(self.build, self.sheet_idx, self.chunk, self.offset))
+            while len(self.pending) > self.workers:
+                self.collect(self.pending.popleft().result())
+        self.sheet_idx, self.offset, self.chunk = self.sheet_idx + 1, 0, []
+        self.sheet, self.pasted = None, 0
+
+    def add(self, tile):
+        if self.pool is None:
+            # Pasted straight into the current sheet, so pipe frames (one shared buffer)
+            # need no copy
+            if self.sheet is None:
+                self.sheet = self.build_base()
+            paste_tile(self.sheet, tile, self.offset + self.pasted, self.cols, self.tile_w, self.tile_h)
+            self.pasted += 1
+        else:
+            # Composed later on the pool; pipe frames share one buffer, so keep a private copy
+            self.chunk.append(tile.copy() if isinstance(tile, Image.Image) else tile)
+        if self.offset + self.pasted + len(self.chunk) >= self.per_sheet:
+            self.submit()
+
+    def build_base(self):
+        base = self.outdir / (self.sprite_pattern % self.sheet_idx) if self.offset else None
+        return compose_sheet([], self.cols, self.rows, self.tile_w, self.tile_h, base, self.offset)
+
+    def close(self):
+        try:
+            if self.chunk or self.pasted:
+                self.submit()
+            while self.pending:
+                self.collect(self.pending.popleft().result())
+        finally:
+            self.abort()
+        elapsed = time.perf_counter() - self.started
+        if self.sprite_files:
+            print(f"  {len(self.sprite_files)} sheets in {elapsed:.2f}s "
+                  f"({len(self.sprite_files) / max(elapsed, 1e-9):.2f} sheets/s, {self.workers} worker(s))")
+        return self.sprite_files
+
+    def abort(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+def assemble_sprites(tiles, outdir, cols, rows, tile_w, tile_h, fmt, workers=1, start=0, timings=None, quality=None):
+    # Pull every tile through a SpriteWriter; returns the names of the sheets written.
+    # Seconds spent encoding are added to timings["encode"] when given.
+    writer = SpriteWriter(outdir, cols, rows, tile_w, tile_h, fmt, workers, start, quality=quality)
+    try:
+        for t in tiles:
+            writer.add(t)
+    except BaseException:
+        writer.abort()
+        raise
+    sprite_files = writer.close()
+    if timings is not None:
+        timings["encode"] = timings.get("encode", 0.0) + writer.encode_seconds
+    return sprite_files
+
+def content_box(media, tile_w, tile_h):
+    # Where the picture sits inside a letterboxed tile_w x tile_h tile (see tile_vf)
+    if not media.width or not media.height:
+        return (0, 0, tile_w, tile_h)
+    scale = min(tile_w / media.width, tile_h / media.height)
+    w, h = max(1, round(media.width * scale)), max(1, round(media.height * scale))
+    x, y = (tile_w - w) // 2, (tile_h - h) // 2
+    return (x, y, x + w, y + h)
+
+def rescale_tile(img, box, tile_w, tile_h):
+    # Letterbox the picture area of a larger tile into a smaller tile
+    pic = img.crop(box)
+    scale = min(tile_w / pic.width, tile_h / pic.height)
+    w, h = max(1, round(pic.width * scale)), max(1, round(pic.height * scale))
+    tile = Image.new("RGB", (tile_w, tile_h), (0,0,0))
+    tile.paste(pic.resize((w, h), Image.LANCZOS), ((tile_w - w) // 2, (tile_h - h) // 2))
+    return tile
+
+def assemble_ladder(tiles, outdir, cols, rows, rungs, box, fmt, workers=1, timings=None, quality=None):
+    # Tiles arrive at the size of rungs[0] (the largest); every other rung is downscaled
+    # from them in-process, so one decode feeds all sizes. rungs is a list of
+    # (tile_w, tile_h, sprite_pattern); returns the sprite names written per rung.
+    writers = [SpriteWriter(outdir, cols, rows, w, h, fmt, workers, sprite_pattern=pattern, quality=quality)
+               for w, h, pattern in rungs]
+    try:
+        for t in tiles:
+            img = t if isinstance(t, Image.Image) else Image.open(t).convert("RGB")
+            writers[0].add(img)
+            for writer in writers[1:]:
+                writer.add(rescale_tile(img, box, writer.tile_w, writer.tile_h))
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+    sprite_sets = [writer.close() for writer in writers]
+    if timings is not None:
+        timings["encode"] = timings.get("encode", 0.0) + sum(w.encode_seconds for w in writers)
+    return sprite_sets
+
+def ffmpeg_sprite_args(fmt, quality=None):
+    # Encoder settings matching save_sprite() for the ffmpeg tile engine. A JPEG quality
+    # maps roughly onto mjpeg's 2-31 qscale (85 -> 3).
+    if fmt == "webp":
+        return ["-c:v", "libwebp", "-quality", str(quality or DEFAULT_QUALITY[fmt]), "-compression_level", "6"]
+    if fmt in ("jpg","jpeg"):
+        return ["-q:v", str(max(2, min(31, round((100 - quality) / 5)))) if quality else "3"]
+    return []
+
+def tile_sprites_ffmpeg(inp, outdir, interval, tile_w, tile_h, cols, rows, fmt, total_frames, jobs=1, progress=None,
+                        quality=None):
+    # Let ffmpeg's tile filter build whole sheets in the decode pass and write
+    # sprite_%d.{fmt} directly. With several jobs each worker owns a run of whole
+    # sheets, so the sheet numbering stays global.
+    per_sheet = cols * rows
+    sheets = int(math.ceil(total_frames / per_sheet))
+    vf = f"fps=1/{interval},{tile_vf(tile_w, tile_h)},tile={cols}x{rows}"
+    threads = decoder_threads(jobs)
+
+    def worker(rng):
+        a, b = rng
+        first, last = a * per_sheet, min(total_frames, b * per_sheet)
+        run([
+            "ffmpeg", "-y", "-threads", threads,
+            "-ss", f"{first * interval:.6f}", "-i", str(inp),
+            "-t", f"{(last - first) * interval:.6f}",
+            "-vf", vf,
+            "-frames:v", str(b - a),
+            "-start_number", str(a),
+            *ffmpeg_sprite_args(fmt, quality),
+            str(outdir / f"sprite_%d.{fmt}")
+        ], progress.part(a) if progress is not None else None)
+
+    ranges = split_ranges(sheets, jobs)
+    with ThreadPoolExecutor(max_workers=max(1, len(ranges))) as pool:
+        list(pool.map(in_context(worker), ranges))
+
+    sprite_files = []
+    for sheet_idx in range(sheets):
+        sprite_name = f"sprite_{sheet_idx}.{fmt}"
+        if not (outdir / sprite_name).exists():
+            break
+        sprite_files.append(sprite_name)
+        print(f"  wrote {sprite_name} ({min(per_sheet, total_frames - sheet_idx * per_sheet)} tiles)")
+    return sprite_files
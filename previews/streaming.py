@@ -0,0 +1,201 @@
+import math, shutil, struct
+
+from .runner import run
+
+# fMP4 HLS / DASH packaging and the I-frame-only HLS playlist for trick play.
+
+def package_hls(src, hls_dir, segment=4.0):
+    # fMP4 HLS (VOD) by stream copy: segments are cut at keyframes, so a short GOP
+    # (see --web-video transcode) keeps them close to `segment` seconds
+    shutil.rmtree(hls_dir, ignore_errors=True)
+    hls_dir.mkdir(parents=True)
+    run([
+        "ffmpeg", "-y", "-v", "error", "-i", str(src), "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+        "-f", "hls", "-hls_time", f"{segment}", "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+        "-hls_segment_filename", str(hls_dir / "seg_%05d.m4s"),
+        "-master_pl_name", "master.m3u8", str(hls_dir / "media.m3u8")
+    ])
+
+def package_dash(src, dash_dir, segment=4.0):
+    shutil.rmtree(dash_dir, ignore_errors=True)
+    dash_dir.mkdir(parents=True)
+    run([
+        "ffmpeg", "-y", "-v", "error", "-i", str(src), "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+        "-f", "dash", "-seg_duration", f"{segment}", "-use_template", "1", "-use_timeline", "1",
+        "-init_seg_name", "init_$RepresentationID$.m4s",
+        "-media_seg_name", "chunk_$RepresentationID$_$Number%05d$.m4s",
+        str(dash_dir / "manifest.mpd")
+    ])
+
+MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"mvex", b"moof", b"traf"}
+
+def mp4_boxes(buf, start=0, end=None):
+    # Yield (type, offset, payload offset, end) for each box in buf[start:end]
+    end = len(buf) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            size, header = struct.unpack_from(">Q", buf, pos + 8)[0], 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            break
+        yield kind, pos, pos + header, pos + size
+        pos += size
+
+def mp4_find(buf, path, start=0, end=None):
+    # Boxes at a path such as b"moov/trak/mdia/mdhd" below buf[start:end]
+    first, _, rest = path.partition(b"/")
+    for kind, _, body, box_end in mp4_boxes(buf, start, end):
+        if kind == first:
+            if rest:
+                yield from mp4_find(buf, rest, body, box_end)
+            else:
+                yield body, box_end
+
+def mp4_video_track(init):
+    # (track id, timescale, default sample flags) of the video track in an init segment
+    for trak, trak_end in mp4_find(init, b"moov/trak"):
+        hdlr = next(mp4_find(init, b"mdia/hdlr", trak, trak_end))[0]
+        if init[hdlr + 8:hdlr + 12] != b"vide":
+            continue
+        tkhd = next(mp4_find(init, b"tkhd", trak, trak_end))[0]
+        track_id = struct.unpack_from(">I", init, tkhd + (20 if init[tkhd] == 1 else 12))[0]
+        mdhd = next(mp4_find(init, b"mdia/mdhd", trak, trak_end))[0]
+        timescale = struct.unpack_from(">I", init, mdhd + (20 if init[mdhd] == 1 else 12))[0]
+        default_flags = 0
+        for trex, _ in mp4_find(init, b"moov/mvex/trex"):
+            tid, _, _, _, flags = struct.unpack_from(">5I", init, trex + 4)
+            if tid == track_id:
+                default_flags = flags
+        return track_id, timescale, default_flags
+    raise RuntimeError("No video track in HLS init segment")
+
+def mp4_sync_samples(buf, track_id, default_flags):
+    # Yield (moof offset, end of sample, decode time) for each fragment whose first sample
+    # of the track is a sync sample. Later keyframes in the same fragment are skipped: a
+    # byte range from the moof would decode the fragment's first sample, not them.
+    for kind, moof, body, moof_end in mp4_boxes(buf):
+        if kind != b"moof":
+            continue
+        for traf, traf_end in mp4_find(buf, b"traf", body, moof_end):
+            tfhd = next(mp4_find(buf, b"tfhd", traf, traf_end))[0]
+            tf_flags = int.from_bytes(buf[tfhd + 1:tfhd + 4], "big")
+            if struct.unpack_from(">I", buf, tfhd + 4)[0] != track_id:
+                continue
+            pos, base = tfhd + 8, moof
+            if tf_flags & 0x1:
+                base = struct.unpack_from(">Q", buf, pos)[0]
+                pos += 8
+            pos += 4 if tf_flags & 0x2 else 0
+            dur = size = 0
+            flags = default_flags
+            if tf_flags & 0x8:
+                dur = struct.unpack_from(">I", buf, pos)[0]
+                pos += 4
+            if tf_flags & 0x10:
+                size = struct.unpack_from(">I", buf, pos)[0]
+                pos += 4
+            if tf_flags & 0x20:
+                flags = struct.unpack_from(">I", buf, pos)[0]
+            t = 0
+            for tfdt, _ in mp4_find(buf, b"tfdt", traf, traf_end):
+                t = struct.unpack_from(">Q" if buf[tfdt] == 1 else ">I", buf, tfdt + 4)[0]
+            first = True
+            for trun, _ in mp4_find(buf, b"trun", traf, traf_end):
+                tr_flags = int.from_bytes(buf[trun + 1:trun + 4], "big")
+                count = struct.unpack_from(">I", buf, trun + 4)[0]
+                pos = trun + 8
+                offset = base
+                if tr_flags & 0x1:
+                    offset += struct.unpack_from(">i", buf, pos)[0]
+                    pos += 4
+                first_flags = None
+                if tr_flags & 0x4:
+                    first_flags = struct.unpack_from(">I", buf, pos)[0]
+                    pos += 4
+                for i in range(count):
+                    s_dur, s_size, s_flags = dur, size, flags if i or first_flags is None else first_flags
+                    if tr_flags & 0x100:
+                        s_dur = struct.unpack_from(">I", buf, pos)[0]
+                        pos += 4
+                    if tr_flags & 0x200:
+                        s_size = struct.unpack_from(">I", buf, pos)[0]
+                        pos += 4
+                    if tr_flags & 0x400:
+                        s_flags = struct.unpack_from(">I", buf, pos)[0]
+                        pos += 4
+                    pos += 4 if tr_flags & 0x800 else 0
+                    if first and not s_flags & 0x10000:  # sample_is_non_sync_sample
+                        yield moof, offset + s_size, t
+                    first = False
+                    offset += s_size
+                    t += s_dur
+
+def write_iframe_playlist(hls_dir, name="iframes.m3u8"):
+    # I-frame-only playlist over the fMP4 segments: each entry is the byte range from a
+    # fragment's moof through the end of its leading keyframe, lasting until the next
+    # entry. ffmpeg writes one fragment per segment, so that is one I-frame per segment.
+    # Also advertised from master.m3u8 via EXT-X-I-FRAME-STREAM-INF.
+    media = (hls_dir / "media.m3u8").read_text(encoding="utf-8").splitlines()
+    segments = [line for line in media if line and not line.startswith("#")]
+    track_id, timescale, default_flags = mp4_video_track((hls_dir / "init.mp4").read_bytes())
+    frames = []
+    for seg in segments:
+        buf = (hls_dir / seg).read_bytes()
+        frames += [(seg, moof, end - moof, t) for moof, end, t in mp4_sync_samples(buf, track_id, default_flags)]
+    if not frames:
+        raise RuntimeError("No keyframes found in HLS segments")
+    total = sum(float(line[8:].rstrip(",")) for line in media if line.startswith("#EXTINF:"))
+    t0 = frames[0][3]
+    ends = [t for _, _, _, t in frames[1:]] + [t0 + total * timescale]
+    entries = [(seg, off, length, (end - t) / timescale) for (seg, off, length, t), end in zip(frames, ends)]
+    lines = ["#EXTM3U", "#EXT-X-VERSION:7",
+             f"#EXT-X-TARGETDURATION:{max(1, math.ceil(max(d for *_, d in entries)))}",
+             "#EXT-X-PLAYLIST-TYPE:VOD", "#EXT-X-I-FRAMES-ONLY", '#EXT-X-MAP:URI="init.mp4"']
+    for seg, off, length, d in entries:
+        lines += [f"#EXTINF:{d:.6f},", f"#EXT-X-BYTERANGE:{length}@{off}", seg]
+    lines.append("#EXT-X-ENDLIST")
+    (hls_dir / name).write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    master_path = hls_dir / "master.m3u8"
+    master = master_path.read_text(encoding="utf-8").splitlines()
+    master = [line for line in master if line and not line.startswith("#EXT-X-I-FRAME-STREAM-INF")]
+    inf = next((line for line in master if line.startswith("#EXT-X-STREAM-INF:")), "")
+    extra = "".join("," + part for part in split_attrs(inf[len("#EXT-X-STREAM-INF:"):])
+                    if part.split("=")[0] in ("RESOLUTION", "CODECS"))
+    bandwidth = max(int(length * 8 / max(d, 1e-3)) for _, _, length, d in entries)
+    master.append(f'#EXT-X-I-FRAME-STREAM-INF:BANDWIDTH={bandwidth}{extra},URI="{name}"')
+    master_path.write_text("\n".join(master) + "\n", encoding="utf-8")
+    return len(entries)
+
+def split_attrs(attrs):
+    # Split an m3u8 attribute list on commas outside quoted strings
+    parts, cur, quoted = [], "", False
+    for ch in attrs:
+        if ch == '"':
+            quoted = not quoted
+        if ch == "," and not quoted:
+            parts.append(cur)
+            cur = ""
+        else:
+            cur += ch
+    return parts + [cur] if cur else parts
+
+def package_video(src, outdir, hls=True, dash=False, segment=4.0):
+    # Segmented renditions of src under outdir/hls and outdir/dash; returns the files
+    # written, relative to outdir
+    dirs = []
+    if hls:
+        package_hls(src, outdir / "hls", segment)
+        n = write_iframe_playlist(outdir / "hls")
+        print(f"  HLS: hls/master.m3u8 with {n} I-frames in hls/iframes.m3u8")
+        dirs.append(outdir / "hls")
+    if dash:
+        package_dash(src, outdir / "dash", segment)
+        print("  DASH: dash/manifest.mpd")
+        dirs.append(outdir / "dash")
+    return sorted(str(f.relative_to(outdir)) for d in dirs for f in d.rglob("*") if f.is_file())
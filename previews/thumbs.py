@@ -0,0 +1,186 @@
+import atexit, bisect, io, queue, subprocess, threading, time
+from collections import OrderedDict, deque
+from pathlib import Path
+from PIL import Image
+
+from .runner import kill_group, reap, spawn
+from .probe import probe_media
+from .extract import tile_vf
+from .cache import fingerprint
+
+# On-demand thumbnails from warm per-video decoders, with an LRU cache of encoded images.
+
+class FrameDecoder:
+    # A running ffmpeg decoding forward from a keyframe at one output size. frame_at(t)
+    # consumes frames up to the last one with pts <= t, so a request a little later
+    # than the previous one continues decoding where that one stopped.
+
+    def __init__(self, video, start, tile_w, tile_h):
+        self.video, self.tile_w, self.tile_h = video, tile_w, tile_h
+        self.frame_size = tile_w * tile_h * 3
+        self.last = None   # (pts, rgb bytes) of the frame most recently returned
+        self.ahead = None  # first frame past the last request
+        self.start = start
+        self.used = time.monotonic()
+        self.busy = False
+        # -copyts + showinfo: each frame's absolute pts is logged to stderr just before
+        # the frame itself is written to stdout
+        self.proc = spawn([
+            "ffmpeg", "-v", "info", "-hide_banner", "-nostats", "-copyts", "-seek_timestamp", "1",
+            "-ss", f"{start:.6f}", "-i", str(video), "-map", "0:v:0",
+            "-vf", f"{tile_vf(tile_w, tile_h)},showinfo", "-fps_mode", "passthrough",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-"
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+        self.pts = queue.Queue()
+        threading.Thread(target=self._read_pts, daemon=True).start()
+
+    def _read_pts(self):
+        for line in self.proc.stderr:
+            i = line.find(b" pts_time:")
+            if i >= 0 and b"showinfo" in line:
+                self.pts.put(float(line[i + 10:].split()[0]))
+        self.pts.put(None)
+
+    def _read(self):
+        buf = bytearray(self.frame_size)
+        view = memoryview(buf)
+        got = 0
+        while got < self.frame_size:
+            n = self.proc.stdout.readinto(view[got:])
+            if not n:
+                return None
+            got += n
+        pts = self.pts.get(timeout=30)
+        return None if pts is None else (pts, bytes(buf))
+
+    def position(self):
+        return self.last[0] if self.last is not None else self.start
+
+    def frame_at(self, t):
+        # None when the decoder is already past t or produced nothing
+        if self.last is not None and self.last[0] > t:
+            return None
+        while True:
+            nxt, self.ahead = self.ahead or self._read(), None
+            if nxt is None:
+                break
+            if nxt[0] > t and self.last is not None:
+                self.ahead = nxt
+                break
+            self.last = nxt
+        self.used = time.monotonic()
+        return self.last
+
+    def close(self):
+        kill_group(self.proc, grace=0)
+        reap(self.proc)
+        self.proc.stdout.close()
+
+THUMB_BUCKET = 0.04         # requests within the same 40 ms share a cached result
+THUMB_CACHE_BYTES = 64 << 20
+THUMB_DECODERS = 4          # warm decoders kept across all videos and sizes
+THUMB_REUSE_WINDOW = 3.0    # decode forward up to this many seconds instead of re-seeking
+_thumb_cache = OrderedDict()
+_thumb_stats = {"requests": 0, "hits": 0, "bytes": 0, "latency": deque(maxlen=2048)}
+_thumb_lock = threading.Lock()
+_decoders = []
+
+def _checkout_decoder(video, media, t, tile_w, tile_h):
+    # Closest idle decoder that can reach t by decoding forward, else a new one started
+    # at the keyframe before t (evicting the least recently used beyond THUMB_DECODERS)
+    with _thumb_lock:
+        usable = [d for d in _decoders if not d.busy and d.video == video and (d.tile_w, d.tile_h) == (tile_w, tile_h)
+                  and d.proc.poll() is None and 0 <= t - d.position() <= THUMB_REUSE_WINDOW]
+        if usable:
+            dec = max(usable, key=lambda d: d.position())
+            dec.busy = True
+            return dec
+    kfs = media.keyframes or [media.start_time]
+    start = kfs[max(0, bisect.bisect_right(kfs, t + 1e-6) - 1)]
+    dec = FrameDecoder(video, start, tile_w, tile_h)
+    dec.busy = True
+    with _thumb_lock:
+        _decoders.append(dec)
+        idle = sorted((d for d in _decoders if not d.busy), key=lambda d: d.used)
+        stale = idle[:max(0, len(_decoders) - THUMB_DECODERS)]
+        for d in stale:
+            _decoders.remove(d)
+    for d in stale:
+        d.close()
+    return dec
+
+def _release_decoder(dec, keep=True):
+    with _thumb_lock:
+        dec.busy = False
+        if not keep and dec in _decoders:
+            _decoders.remove(dec)
+    if not keep:
+        dec.close()
+
+def close_decoders():
+    with _thumb_lock:
+        stale = list(_decoders)
+        _decoders.clear()
+    for d in stale:
+        d.close()
+
+atexit.register(close_decoders)
+
+def decode_frame(video, media, t, tile_w, tile_h):
+    # RGB bytes of the last frame at or before absolute time t, letterboxed to tile size
+    for attempt in range(2):
+        dec = _checkout_decoder(video, media, t, tile_w, tile_h)
+        try:
+            frame = dec.frame_at(t)
+        except BaseException:
+            _release_decoder(dec, keep=False)
+            raise
+        if frame is not None:
+            _release_decoder(dec)
+            return frame[1]
+        _release_decoder(dec, keep=False)
+    raise RuntimeError(f"Could not decode a frame of {video} at {t:.3f}s")
+
+def thumbnail(video, t, size=(320, 180), fmt="jpeg", quality=85):
+    # Encoded image of the frame shown at t seconds (from the start of the video),
+    # letterboxed to size. Seeks to the keyframe before t using the memoized keyframe
+    # index, reuses warm decoders for nearby later times, and caches results by
+    # (video, t bucket, size) in an LRU bounded by THUMB_CACHE_BYTES.
+    started = time.perf_counter()
+    video = Path(video).resolve()
+    tile_w, tile_h = size
+    media = probe_media(video, keyframes=True)
+    bucket = int(min(max(0.0, t), max(0.0, media.duration - 1e-3)) / THUMB_BUCKET)
+    key = (fingerprint(video), bucket, tile_w, tile_h, fmt, quality)
+    with _thumb_lock:
+        body = _thumb_cache.get(key)
+        if body is not None:
+            _thumb_cache.move_to_end(key)
+            _thumb_stats["hits"] += 1
+    if body is None:
+        at = media.start_time + bucket * THUMB_BUCKET
+        img = Image.frombytes("RGB", (tile_w, tile_h), decode_frame(video, media, at, tile_w, tile_h))
+        out = io.BytesIO()
+        img.save(out, format=fmt, quality=quality)
+        body = out.getvalue()
+        with _thumb_lock:
+            if key not in _thumb_cache:
+                _thumb_cache[key] = body
+                _thumb_stats["bytes"] += len(body)
+            while _thumb_stats["bytes"] > THUMB_CACHE_BYTES and _thumb_cache:
+                _thumb_stats["bytes"] -= len(_thumb_cache.popitem(last=False)[1])
+    with _thumb_lock:
+        _thumb_stats["requests"] += 1
+        _thumb_stats["latency"].append(time.perf_counter() - started)
+    return body
+
+def thumbnail_stats():
+    # Request/hit counts and p50/p99 latency (ms) over the most recent requests
+    with _thumb_lock:
+        lat = sorted(_thumb_stats["latency"])
+        stats = {k: _thumb_stats[k] for k in ("requests", "hits", "bytes")}
+        stats["cached"] = len(_thumb_cache)
+        stats["decoders"] = len(_decoders)
+    pct = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000, 2) if lat else None
+    stats.update(p50_ms=pct(0.50), p99_ms=pct(0.99))
+    return stats
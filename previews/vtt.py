@@ -0,0 +1,145 @@
+import mmap, struct
+
+# Cue tables, thumbnails.vtt and the binary thumbnails.idx sidecar.
+
+def hhmmss_ms(t):
+    # t in seconds -> "HH:MM:SS.mmm"
+    hrs = int(t // 3600)
+    t -= hrs * 3600
+    mins = int(t // 60)
+    secs = t - mins * 60
+    return f"{hrs:02d}:{mins:02d}:{secs:06.3f}"
+
+def parse_ts(ts):
+    # "HH:MM:SS.mmm" -> seconds
+    hh, mm, ss = ts.strip().split(":")
+    return int(hh) * 3600 + int(mm) * 60 + float(ss)
+
+def read_vtt_tail(path, tail=4096):
+    # Last cue of a thumbnails.vtt without reading the whole file. Returns its timing,
+    # target and the byte offset of its timing line, or None if there are no cues.
+    size = path.stat().st_size
+    with open(path, "rb") as f:
+        f.seek(max(0, size - tail))
+        data = f.read()
+    arrow = data.rfind(b" --> ")
+    if arrow < 0:
+        return None
+    line_start = data.rfind(b"\n", 0, arrow) + 1
+    lines = data[line_start:].decode("utf-8").splitlines()
+    start, end = lines[0].split("-->")
+    url, _, xywh = lines[1].strip().partition("#xywh=")
+    x, y, w, h = map(int, xywh.split(","))
+    return {
+        "start": parse_ts(start), "end": parse_ts(end),
+        "url": url, "x": x, "y": y, "w": w, "h": h,
+        "offset": max(0, size - tail) + line_start,
+    }
+
+CUE_CHUNK = 8192
+IDX_HEADER = struct.Struct("<4sHHHHI")  # magic, version, tile_w, tile_h, sprite name pattern length, cue count
+IDX_RECORD = struct.Struct("<IIIHH")    # start_ms, end_ms, sheet, x, y
+IDX_DTYPE = [("start", "<u4"), ("end", "<u4"), ("sheet", "<u4"), ("x", "<u2"), ("y", "<u2")]
+
+def uniform_cue_rows(first, total_frames, interval, duration, cols, per_sheet, tile_w, tile_h, chunk=CUE_CHUNK):
+    # Cue table for evenly spaced thumbnails [first, total_frames), as NumPy column
+    # chunks (start_ms, end_ms, sheet, x, y) so memory stays flat however many cues
+    import numpy as np
+    duration_ms = int(round(duration * 1000))
+    for a in range(first, total_frames, chunk):
+        idx = np.arange(a, min(total_frames, a + chunk), dtype=np.int64)
+        start = np.rint(idx * interval * 1000).astype(np.int64)
+        end = np.minimum(duration_ms, np.rint((idx * interval + interval) * 1000).astype(np.int64))
+        sheet, pos = np.divmod(idx, per_sheet)
+        yield start, end, sheet, (pos % cols) * tile_w, (pos // cols) * tile_h
+
+def _hms_columns(ms):
+    # Vectorized ms -> (hours, minutes, seconds, millis) lists for "%02d:%02d:%02d.%03d"
+    import numpy as np
+    secs, millis = np.divmod(ms, 1000)
+    mins, secs = np.divmod(secs, 60)
+    hrs, mins = np.divmod(mins, 60)
+    return hrs.tolist(), mins.tolist(), secs.tolist(), millis.tolist()
+
+def cue_rows(starts, ends, slots, cols, per_sheet, tile_w, tile_h, chunk=CUE_CHUNK):
+    # Cue table for arbitrary cues: starts/ends in seconds and the sprite slot (global
+    # tile index) each cue shows, in the same column chunks as uniform_cue_rows
+    import numpy as np
+    starts = np.rint(np.asarray(starts, dtype=np.float64) * 1000).astype(np.int64)
+    ends = np.rint(np.asarray(ends, dtype=np.float64) * 1000).astype(np.int64)
+    slots = np.asarray(slots, dtype=np.int64)
+    for a in range(0, len(slots), chunk):
+        sheet, pos = np.divmod(slots[a:a + chunk], per_sheet)
+        yield starts[a:a + chunk], ends[a:a + chunk], sheet, (pos % cols) * tile_w, (pos // cols) * tile_h
+
+def write_vtt(vtt_path, chunks, sprite_pattern, tile_w, tile_h, append_at=None):
+    # Stream cues to thumbnails.vtt through a buffered writer, one chunk at a time.
+    # append_at is a byte offset to truncate to and continue from (incremental runs).
+    # Returns the number of cues written.
+    template = "%02d:%02d:%02d.%03d --> %02d:%02d:%02d.%03d\n%s#xywh=%d,%d," + f"{tile_w},{tile_h}\n"
+    count = 0
+    with open(vtt_path, "r+b" if append_at is not None else "wb", buffering=1 << 20) as f:
+        if append_at is not None:
+            f.truncate(append_at)
+            f.seek(append_at)
+        else:
+            f.write(b"WEBVTT\n\n")
+        for start, end, sheet, x, y in chunks:
+            urls = [sprite_pattern % i for i in sheet.tolist()]
+            rows = zip(*_hms_columns(start), *_hms_columns(end), urls, x.tolist(), y.tolist())
+            text = "\n".join(template % row for row in rows)
+            # Cues are separated by a blank line; the file ends right after the last cue
+            f.write((("\n" if count else "") + text).encode("utf-8"))
+            count += len(urls)
+    return count
+
+def write_cue_index(index_path, chunks, sprite_pattern, tile_w, tile_h, first=0):
+    # Binary sidecar next to thumbnails.vtt: a header, the sprite name pattern, then one
+    # fixed-width IDX_RECORD per cue sorted by start time, so readers can binary-search
+    # it (see find_cue) instead of parsing the VTT. first > 0 rewrites from that cue on.
+    import numpy as np
+    name = sprite_pattern.encode("utf-8")
+    header_size = IDX_HEADER.size + len(name)
+    if first and index_path.exists():
+        with open(index_path, "rb") as f:
+            head = f.read(header_size)
+        if head[:4] != b"VTTI" or head[IDX_HEADER.size:] != name:
+            raise RuntimeError(f"{index_path} does not match the current sprite layout")
+        mode = "r+b"
+    else:
+        first, mode = 0, "wb"
+    count = first
+    with open(index_path, mode, buffering=1 << 20) as f:
+        f.truncate(header_size + first * IDX_RECORD.size)
+        f.seek(header_size + first * IDX_RECORD.size)
+        for start, end, sheet, x, y in chunks:
+            rec = np.empty(len(start), dtype=IDX_DTYPE)
+            rec["start"], rec["end"], rec["sheet"], rec["x"], rec["y"] = start, end, sheet, x, y
+            f.write(rec.tobytes())
+            count += len(rec)
+        f.seek(0)
+        f.write(IDX_HEADER.pack(b"VTTI", 1, tile_w, tile_h, len(name), count) + name)
+    return count
+
+def find_cue(index_path, t):
+    # Binary search a cue index for time t (seconds). Returns (start, end, sprite, x, y, w, h)
+    # of the last cue starting at or before t, or None if the index is empty or t comes
+    # before the first cue.
+    with open(index_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        magic, _, tile_w, tile_h, name_len, count = IDX_HEADER.unpack_from(m, 0)
+        if magic != b"VTTI" or not count:
+            return None
+        pattern = m[IDX_HEADER.size:IDX_HEADER.size + name_len].decode("utf-8")
+        base = IDX_HEADER.size + name_len
+        ms = int(t * 1000)
+        lo, hi = 0, count - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if IDX_RECORD.unpack_from(m, base + mid * IDX_RECORD.size)[0] <= ms:
+                lo = mid
+            else:
+                hi = mid - 1
+        start, end, sheet, x, y = IDX_RECORD.unpack_from(m, base + lo * IDX_RECORD.size)
+        if start > ms:
+            return None
+        return start / 1000, end / 1000, pattern % sheet, x, y, tile_w, tile_h
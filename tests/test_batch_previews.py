@@ -0,0 +1,48 @@
+import io, threading
+from pathlib import Path
+
+import pytest
+
+from batch_previews import JobStdout, assign_outdirs, collect_inputs, job_log
+from previews.runner import in_context
+
+def test_collect_and_assign_keep_extension_on_clash(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    for name in ("a.mp4", "a.mkv", "sub/b.mp4", "notes.txt"):
+        (src / name).write_bytes(b"")
+    out = tmp_path / "out"
+    jobs = dict(assign_outdirs(out, collect_inputs(str(src), None)))
+    assert jobs == {
+        (src / "a.mkv").resolve(): (out / "a.mkv").resolve(),
+        (src / "a.mp4").resolve(): (out / "a.mp4").resolve(),
+        (src / "sub/b.mp4").resolve(): (out / "sub/b").resolve(),
+    }
+
+def test_assign_outdirs_rejects_remaining_clash(tmp_path):
+    inputs = [(tmp_path / "x/a.mp4", None, Path("a.mp4")), (tmp_path / "y/a.mp4", None, Path("a.mp4"))]
+    with pytest.raises(ValueError, match="would both write to"):
+        assign_outdirs(tmp_path / "out", inputs)
+    manifest = [(tmp_path / "a.mp4", "same", Path("a.mp4")), (tmp_path / "b.mp4", "same", Path("b.mp4"))]
+    with pytest.raises(ValueError):
+        assign_outdirs(tmp_path / "out", manifest)
+
+def test_job_stdout_follows_threads_started_in_context():
+    console, log = io.StringIO(), io.StringIO()
+    out = JobStdout(console)
+
+    def job():
+        token = job_log.set(log)
+        try:
+            out.write("job\n")
+            t = threading.Thread(target=in_context(out.write), args=("worker\n",))
+            t.start()
+            t.join()
+        finally:
+            job_log.reset(token)
+
+    t = threading.Thread(target=job)
+    t.start()
+    t.join()
+    out.write("summary\n")
+    assert log.getvalue() == "job\nworker\n" and console.getvalue() == "summary\n"
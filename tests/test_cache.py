@@ -0,0 +1,32 @@
+import argparse
+
+from previews.cache import cache_key
+from previews.cli import add_preview_args
+
+def key(inp, *argv):
+    ap = argparse.ArgumentParser()
+    add_preview_args(ap)
+    return cache_key(inp, ap.parse_args(list(argv)))
+
+def test_cache_key_poster_options(tmp_path):
+    inp = tmp_path / "in.mp4"
+    inp.write_bytes(b"\0" * 4096)
+    seek = key(inp, "--poster", "seek")
+    assert key(inp, "--poster", "seek", "--poster-candidates", "5") == seek
+    assert key(inp, "--poster", "tile") != seek
+    assert key(inp, "--poster", "tile", "--poster-candidates", "5") != key(inp, "--poster", "tile")
+
+def test_cache_key_follows_input(tmp_path):
+    inp = tmp_path / "in.mp4"
+    inp.write_bytes(b"\0" * 4096)
+    before = key(inp)
+    inp.write_bytes(b"\1" * 4096)
+    assert key(inp) != before
+
+def test_cache_key_incremental(tmp_path):
+    # An incremental run continues whatever is in the outdir, so it never shares an entry
+    # with a full run
+    inp = tmp_path / "in.mp4"
+    inp.write_bytes(b"\0" * 4096)
+    assert key(inp, "--incremental", "--format", "jpg", "--tile", "5x5", "--quality", "80") != \
+        key(inp, "--format", "jpg", "--tile", "5x5", "--quality", "80")
@@ -0,0 +1,33 @@
+import argparse, shutil, subprocess
+
+import pytest
+
+from previews.cli import add_preview_args, check_preview_args, generate
+
+def run(inp, outdir, *argv):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("input")
+    ap.add_argument("outdir")
+    add_preview_args(ap)
+    args = ap.parse_args([str(inp), str(outdir), "--interval", "1", "--tile", "2x2", "--tile-size", "64x36",
+                          "--format", "jpg", "--quality", "80", *argv])
+    check_preview_args(ap, args)
+    return generate(args)
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+@pytest.mark.parametrize("mode", [[], ["--extract", "seek"], ["--pipe"]])
+def test_incremental_matches_full_run(tmp_path, mode):
+    # A recording that grew from 6 s (last sheet half full) to 11 s
+    full = tmp_path / "full.mp4"
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=160x90:rate=25:duration=11",
+                    "-c:v", "libx264", "-g", "25", str(full)], check=True)
+    part = tmp_path / "part.mp4"
+    subprocess.run(["ffmpeg", "-v", "error", "-i", str(full), "-t", "6", "-c", "copy", str(part)], check=True)
+    run(full, tmp_path / "full", *mode)
+    grown = tmp_path / "grown"
+    run(part, grown, *mode)
+    run(full, grown, "--incremental", *mode)
+    names = sorted(p.name for p in (tmp_path / "full").glob("sprite_*.jpg")) + ["thumbnails.vtt", "thumbnails.idx"]
+    assert sorted(p.name for p in grown.glob("sprite_*.jpg")) == names[:-2]
+    for name in names:
+        assert (grown / name).read_bytes() == (tmp_path / "full" / name).read_bytes(), name
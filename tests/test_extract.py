@@ -0,0 +1,51 @@
+import shutil, subprocess
+
+import pytest
+
+from previews.extract import pick_scene_times, scene_scores, snap_to_keyframes, split_ranges
+
+def test_split_ranges_covers_everything_once():
+    for total in (1, 7, 48, 100):
+        for parts in (1, 3, 4, 200):
+            ranges = split_ranges(total, parts)
+            assert ranges[0][0] == 0 and ranges[-1][1] == total
+            assert all(a < b for a, b in ranges)
+            assert all(b == a2 for (_, b), (a2, _) in zip(ranges, ranges[1:]))
+            sizes = [b - a for a, b in ranges]
+            assert len(ranges) == min(parts, total) and max(sizes) - min(sizes) <= 1
+
+def test_snap_to_keyframes_picks_nearest():
+    assert snap_to_keyframes([0.0, 0.9, 1.1, 5.0, 99.0], [0.0, 2.0, 4.0]) == [0.0, 0.0, 2.0, 4.0, 4.0]
+
+def test_pick_scene_times_budget_threshold_and_gap():
+    scores = [(1.0, 0.9), (1.2, 0.95), (5.0, 0.5), (8.0, 0.2), (9.0, 0.4)]
+    assert pick_scene_times(scores, budget=10, threshold=0.3, min_gap=1.0) == [0.0, 1.2, 5.0, 9.0]
+    assert pick_scene_times(scores, budget=3, threshold=0.3, min_gap=1.0) == [0.0, 1.2, 5.0]
+    assert pick_scene_times([(0.5, 1.0)], budget=10, threshold=0.3, min_gap=1.0) == [0.0]
+
+def test_pick_scene_times_fills_budget_by_splitting_long_cues():
+    # One cut in 65 s: the rest of the budget halves the longest cues
+    times = pick_scene_times([(20.0, 0.9)], budget=6, threshold=0.3, min_gap=1.0, duration=65.0)
+    assert times == [0.0, 10.0, 20.0, 31.25, 42.5, 53.75]
+    # Static footage: no cuts at all still spends the budget
+    assert len(pick_scene_times([], budget=10, threshold=0.3, min_gap=1.0, duration=65.0)) == 10
+    # ...but never below min_gap, and never past the budget
+    times = pick_scene_times([], budget=100, threshold=0.3, min_gap=4.0, duration=20.0)
+    assert times == [0.0, 5.0, 10.0, 15.0]
+    assert min(b - a for a, b in zip(times, times[1:])) >= 4.0
+    assert pick_scene_times([(20.0, 0.9)], budget=2, threshold=0.3, min_gap=1.0, duration=65.0) == [0.0, 20.0]
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_scene_scores_threshold_matches_filtering(tmp_path):
+    # Two hard cuts: test pattern -> solid red -> solid blue
+    src = tmp_path / "cuts.mp4"
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=160x90:rate=25:duration=2",
+                    "-f", "lavfi", "-i", "color=c=red:size=160x90:rate=25:duration=2",
+                    "-f", "lavfi", "-i", "color=c=blue:size=160x90:rate=25:duration=2",
+                    "-filter_complex", "[0][1][2]concat=n=3:v=1[v]", "-map", "[v]", "-c:v", "libx264", str(src)],
+                   check=True)
+    every = scene_scores(src)
+    assert len(every) == 150
+    cuts = scene_scores(src, threshold=0.3)
+    assert cuts == [s for s in every if s[1] >= 0.3]
+    assert [round(t) for t, _ in cuts] == [2, 4]
@@ -0,0 +1,38 @@
+import multiprocessing
+
+from previews.metrics import Metrics, io_bytes, read_prom_totals, write_prom
+
+def one_run(path):
+    metrics = Metrics()
+    metrics.add("extract", 0.5, 0.25, 100, 10)
+    write_prom(path, metrics, {"frames": 3, "sheets": 1})
+
+def runs(path, n):
+    for _ in range(n):
+        one_run(path)
+
+def test_prom_totals_are_per_file(tmp_path):
+    a, b = tmp_path / "a.prom", tmp_path / "b.prom"
+    one_run(a)
+    one_run(a)
+    one_run(b)
+    assert read_prom_totals(a)["preview_runs_total"] == 2
+    assert read_prom_totals(b)["preview_runs_total"] == 1
+    assert read_prom_totals(a)['preview_stage_read_bytes_total{stage="extract"}'] == 200
+
+def test_prom_totals_shared_between_processes(tmp_path):
+    path = tmp_path / "fleet.prom"
+    procs = [multiprocessing.Process(target=runs, args=(path, 10)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    totals = read_prom_totals(path)
+    assert totals["preview_runs_total"] == 40 and totals["preview_frames_total"] == 120
+
+def test_io_bytes_counts_cached_reads(tmp_path):
+    f = tmp_path / "data"
+    f.write_bytes(b"x" * (1 << 20))
+    read, written = io_bytes()
+    f.read_bytes()
+    assert io_bytes()[0] - read >= 1 << 20
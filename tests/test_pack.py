@@ -0,0 +1,24 @@
+import math
+
+from PIL import Image, ImageDraw
+
+from previews.pack import choose_grid, ssim
+
+def test_choose_grid_fewest_sheets_within_budget():
+    # 100 tiles of 1000 bytes, 40 KB per sheet: at most 40 tiles a sheet -> 3 sheets
+    cols, rows = choose_grid(100, 160, 90, 1000, 40000)
+    assert cols * rows <= 40 and math.ceil(100 / (cols * rows)) == 3
+    # The last sheet is at least half full
+    assert 100 - (math.ceil(100 / (cols * rows)) - 1) * cols * rows >= cols * rows / 2
+
+def test_choose_grid_single_sheet_and_canvas_limit():
+    cols, rows = choose_grid(12, 160, 90, 100, 1 << 20)
+    assert cols * rows >= 12 and cols * rows - 12 < min(cols, rows)
+    cols, rows = choose_grid(10000, 160, 90, 1, 1 << 30, max_side=1600)
+    assert cols * 160 <= 1600 and rows * 90 <= 1600
+
+def test_ssim_identical_and_degraded():
+    img = Image.new("RGB", (64, 48))
+    ImageDraw.Draw(img).ellipse((8, 8, 56, 40), fill=(200, 120, 40))
+    assert ssim(img, img) == 1.0
+    assert ssim(img, img.resize((16, 12)).resize((64, 48))) < 0.99
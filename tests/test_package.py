@@ -0,0 +1,22 @@
+import importlib, subprocess, sys
+
+import previews
+
+def test_every_export_resolves():
+    for module, names in previews._MODULES.items():
+        mod = importlib.import_module(f"previews.{module}")
+        for name in names:
+            assert getattr(previews, name) is getattr(mod, name)
+
+def test_public_names_are_exported():
+    # Public functions/classes defined in a stage module are reachable from the package
+    for module, names in previews._MODULES.items():
+        mod = importlib.import_module(f"previews.{module}")
+        public = {name for name, value in vars(mod).items()
+                  if not name.startswith("_") and getattr(value, "__module__", None) == mod.__name__}
+        assert public <= set(names), (module, sorted(public - set(names)))
+
+def test_import_loads_no_stage_modules():
+    code = "import sys, previews; print(sorted(m for m in sys.modules if m.startswith(('previews.', 'PIL', 'numpy'))))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
@@ -0,0 +1,112 @@
+import asyncio, gzip, os
+
+import preview_server
+from preview_server import IMMUTABLE, FileMemo, cache_control, handle, last_sheets, parse_range, resolve
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=500-5000", 1000) == (500, 999)
+    assert parse_range("bytes=1000-", 1000) is False
+    assert parse_range("bytes=5-4", 1000) is False
+    assert parse_range("bytes=-0", 1000) is False
+    assert parse_range("bytes=-", 1000) is None
+    assert parse_range("items=0-1", 1000) is None
+
+def test_cache_control_revalidates_previews():
+    for name in ("thumbnails.vtt", "seg_00001.m4s", "master.m3u8"):
+        assert cache_control(name) == "no-cache"
+    assert cache_control("video.mp4") == "public, max-age=3600"
+
+def test_only_the_last_sprite_sheet_is_revalidated(tmp_path):
+    for name in ("sprite_0.webp", "sprite_1.webp", "sprite_2.webp", "sprite_160x90_0.jpg",
+                 "sprite_160x90_1.jpg", "sprite_320x180_0.jpg", "thumbnails.vtt"):
+        (tmp_path / name).write_bytes(b"x")
+    last = last_sheets(tmp_path, tmp_path.stat())
+    assert last == {"sprite_2.webp", "sprite_160x90_1.jpg", "sprite_320x180_0.jpg"}
+    assert cache_control("sprite_2.webp", last) == "no-cache"
+    assert cache_control("sprite_10.webp", last) == IMMUTABLE == "public, max-age=31536000, immutable"
+    for name in ("sprite_0.webp", "sprite_1.webp", "sprite_160x90_0.jpg"):
+        assert cache_control(name, last) == IMMUTABLE
+    assert cache_control("thumbnails.vtt", last) == "no-cache"
+
+def test_file_memo_replaces_versions_and_evicts(tmp_path):
+    a, b, c = (tmp_path / n for n in "abc")
+    for f in (a, b, c):
+        f.write_bytes(b"x")
+    memo = FileMemo(10, size=len)
+    memo.put(a, a.stat(), b"1234")
+    memo.put(b, b.stat(), b"1234")
+    assert memo.get(a, a.stat()) == b"1234"
+    a.write_bytes(b"xy")
+    assert memo.get(a, a.stat()) is None
+    memo.put(a, a.stat(), b"12345")
+    assert len(memo.entries) == 2 and memo.total == 9
+    memo.put(c, c.stat(), b"123")  # over the limit: b is the least recently used
+    assert memo.get(b, b.stat()) is None and memo.total == 8
+
+async def fetch(port, path, **headers):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = [f"GET {path} HTTP/1.1", "Host: test", "Connection: close"]
+    lines += [f"{k.replace('_', '-')}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    status, *fields = head.decode().split("\r\n")
+    return int(status.split()[1]), {k.lower(): v for k, _, v in (f.partition(": ") for f in fields)}, body
+
+def test_gzip_variant_etag_and_revalidation(tmp_path):
+    vtt = tmp_path / "thumbnails.vtt"
+    vtt.write_text("WEBVTT\n\n00:00.000 --> 00:02.000\nsprite_0.webp#xywh=0,0,160,90\n" * 20)
+
+    async def scenario():
+        server = await asyncio.start_server(lambda r, w: handle(r, w, [("/", tmp_path)], False), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            status, plain, body = await fetch(port, "/thumbnails.vtt")
+            assert status == 200 and body == vtt.read_bytes()
+            status, gz, body = await fetch(port, "/thumbnails.vtt", accept_encoding="gzip")
+            assert status == 200 and gzip.decompress(body) == vtt.read_bytes()
+            assert gz["etag"] != plain["etag"] and gz["etag"].endswith('-gz"')
+            status, _, _ = await fetch(port, "/thumbnails.vtt", accept_encoding="gzip", if_none_match=gz["etag"])
+            assert status == 304
+            status, _, _ = await fetch(port, "/thumbnails.vtt", if_none_match=gz["etag"])
+            assert status == 200
+            # Rewritten in place: the old tag no longer matches and the memo holds one version
+            vtt.write_text("WEBVTT\n")
+            os.utime(vtt, ns=(1, 1))
+            status, fresh, _ = await fetch(port, "/thumbnails.vtt", if_none_match=plain["etag"])
+            assert status == 200 and fresh["etag"] != plain["etag"]
+            assert len(preview_server._etags.entries) == 1
+
+    preview_server._etags = FileMemo(preview_server.MEMO_ENTRIES)
+    asyncio.run(scenario())
+
+def test_resolve_follows_symlinks_but_not_out_of_the_mount(tmp_path):
+    # --link-mode symlink places the source video as a link to a file outside the outdir
+    src = tmp_path / "videos" / "in.mp4"
+    src.parent.mkdir()
+    src.write_bytes(b"video")
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / "in.mp4").symlink_to(src)
+    (out / "sprite_0.webp").write_bytes(b"sheet")
+    mounts = [("/", out)]
+    assert resolve(mounts, "/in.mp4") == out / "in.mp4"
+    assert resolve(mounts, "/sprite_0.webp") == out / "sprite_0.webp"
+    assert resolve(mounts, "/../videos/in.mp4") is None
+    assert resolve(mounts, "/%2e%2e/videos/in.mp4") is None
+    assert resolve(mounts, "//etc/passwd") is None
+
+    async def scenario():
+        server = await asyncio.start_server(lambda r, w: handle(r, w, mounts, False), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            status, _, body = await fetch(port, "/in.mp4")
+            assert status == 200 and body == b"video"
+            status, _, _ = await fetch(port, "/../videos/in.mp4")
+            assert status == 404
+
+    asyncio.run(scenario())
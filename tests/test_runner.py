@@ -0,0 +1,61 @@
+import sys, threading
+
+import pytest
+
+from previews import runner
+
+def py(code):
+    return [sys.executable, "-c", code]
+
+def test_iter_lines_streams_stdout():
+    assert list(runner.iter_lines(py("for i in range(3): print(f'line {i}')"))) == ["line 0", "line 1", "line 2"]
+
+def test_iter_lines_failure_reports_stderr():
+    with pytest.raises(RuntimeError, match="boom"):
+        list(runner.iter_lines(py("import sys; print('x'); sys.exit('boom')")))
+
+def test_iter_lines_stops_child_when_abandoned():
+    lines = runner.iter_lines(py("import itertools\nfor i in itertools.count(): print(i, flush=True)"))
+    assert next(lines) == "0"
+    lines.close()
+    assert not runner._children
+
+def test_iter_lines_cancel():
+    cancel = threading.Event()
+    lines = runner.iter_lines(py("import itertools\nfor i in itertools.count(): print(i, flush=True)"), cancel=cancel)
+    next(lines)
+    cancel.set()
+    with pytest.raises(RuntimeError, match="cancelled"):
+        list(lines)
+    assert not runner._children
+
+def test_run_returns_stdout_and_raises():
+    assert runner.run(py("print(' ok ')")) == "ok"
+    with pytest.raises(RuntimeError, match="Command failed"):
+        runner.run(py("raise SystemExit(3)"))
+
+def test_output_tail_keeps_the_end():
+    tail = runner.OutputTail(limit=10)
+    for chunk in (b"abcdef", b"ghijkl", b"mnop"):
+        tail.append(chunk)
+    assert tail.text() == "ghijklmnop"
+
+def test_in_context_carries_cancel_scope():
+    cancel = threading.Event()
+    cancel.set()
+    seen = []
+    runner.cancel_scope.event = cancel
+    try:
+        worker = runner.in_context(lambda: seen.append(getattr(runner.cancel_scope, "event", None)))
+    finally:
+        runner.cancel_scope.event = None
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+    assert seen == [cancel]
+    runner.cancel_scope.event = cancel
+    try:
+        with pytest.raises(RuntimeError, match="cancelled"):
+            runner.in_context(runner.run)(py("import time; time.sleep(5)"))
+    finally:
+        runner.cancel_scope.event = None
@@ -0,0 +1,36 @@
+from PIL import Image
+
+from previews.sprite import SpriteWriter, assemble_sprites
+
+def shared_buffer_tiles(n, w=8, h=6):
+    # Like iter_raw_frames: one buffer, overwritten for every frame
+    buf = bytearray(w * h * 3)
+    for i in range(n):
+        buf[:] = bytes([i * 20 % 256, 255 - i * 20 % 256, i]) * (w * h)
+        yield Image.frombuffer("RGB", (w, h), buf, "raw", "RGB", 0, 1)
+
+def tile_colors(path, cols, rows, w=8, h=6):
+    sheet = Image.open(path).convert("RGB")
+    return [sheet.getpixel((c * w + w // 2, r * h + h // 2)) for r in range(rows) for c in range(cols)]
+
+def test_shared_buffer_tiles_without_and_with_pool(tmp_path):
+    for workers in (1, 3):
+        out = tmp_path / str(workers)
+        out.mkdir()
+        files = assemble_sprites(shared_buffer_tiles(10), out, 2, 2, 8, 6, "png", workers)
+        assert files == ["sprite_0.png", "sprite_1.png", "sprite_2.png"]
+        colors = [c for f in files for c in tile_colors(out / f, 2, 2)]
+        expected = [(i * 20 % 256, 255 - i * 20 % 256, i) for i in range(10)] + [(0, 0, 0)] * 2
+        assert colors == expected
+    for name in files:
+        assert (tmp_path / "1" / name).read_bytes() == (tmp_path / "3" / name).read_bytes()
+
+def test_writer_continues_partial_sheet(tmp_path):
+    tiles = list(Image.new("RGB", (8, 6), (i * 40, 0, 0)) for i in range(6))
+    assemble_sprites(tiles[:3], tmp_path, 2, 2, 8, 6, "png")
+    writer = SpriteWriter(tmp_path, 2, 2, 8, 6, "png", start=3)
+    for t in tiles[3:]:
+        writer.add(t)
+    assert writer.close() == ["sprite_0.png", "sprite_1.png"]
+    assert tile_colors(tmp_path / "sprite_0.png", 2, 2) == [(i * 40, 0, 0) for i in range(4)]
+    assert tile_colors(tmp_path / "sprite_1.png", 2, 2)[:2] == [(160, 0, 0), (200, 0, 0)]
@@ -0,0 +1,78 @@
+import shutil, struct, subprocess
+
+import pytest
+
+from previews.streaming import mp4_boxes, mp4_find, mp4_sync_samples, mp4_video_track, write_iframe_playlist
+
+NON_SYNC = 0x10000
+
+def box(kind, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+def full_box(kind, version, flags, payload=b""):
+    return box(kind, bytes([version]) + flags.to_bytes(3, "big") + payload)
+
+def fragment(track_id, decode_time, samples):
+    # moof + mdat; samples are (duration, size, flags), offsets relative to the moof
+    tfhd = full_box(b"tfhd", 0, 0x20000, struct.pack(">I", track_id))  # default-base-is-moof
+    tfdt = full_box(b"tfdt", 1, 0, struct.pack(">Q", decode_time))
+    entries = b"".join(struct.pack(">3I", *s) for s in samples)
+    trun_size = 8 + 4 + 4 + 4 + len(entries)
+    moof_size = 8 + 8 + len(tfhd) + len(tfdt) + trun_size
+    trun = full_box(b"trun", 0, 0x1 | 0x100 | 0x200 | 0x400,
+                    struct.pack(">Ii", len(samples), moof_size + 8) + entries)
+    moof = box(b"moof", box(b"traf", tfhd + tfdt + trun))
+    assert len(moof) == moof_size
+    return moof + box(b"mdat", bytes(sum(size for _, size, _ in samples)))
+
+def test_mp4_boxes_and_find():
+    buf = box(b"moov", box(b"trak", box(b"tkhd", b"x" * 4))) + box(b"free")
+    assert [k for k, *_ in mp4_boxes(buf)] == [b"moov", b"free"]
+    (body, end), = mp4_find(buf, b"moov/trak/tkhd")
+    assert buf[body:end] == b"x" * 4
+
+def test_mp4_boxes_largesize():
+    buf = struct.pack(">I4sQ", 1, b"mdat", 16 + 3) + b"abc"
+    assert list(mp4_boxes(buf)) == [(b"mdat", 0, 16, 19)]
+
+def test_sync_samples_one_per_fragment():
+    # Two keyframes in the first fragment (GOP shorter than the fragment): only the
+    # leading one is addressable by a byte range from the moof
+    first = fragment(1, 0, [(512, 1000, 0), (512, 10, NON_SYNC), (512, 900, 0), (512, 10, NON_SYNC)])
+    second = fragment(1, 2048, [(512, 800, 0), (512, 10, NON_SYNC)])
+    buf = first + second
+    first_moof, second_moof = len(first) - 8 - 1920, len(second) - 8 - 810
+    assert list(mp4_sync_samples(buf, 1, 0)) == [
+        (0, first_moof + 8 + 1000, 0),
+        (len(first), len(first) + second_moof + 8 + 800, 2048),
+    ]
+
+def test_sync_samples_skips_fragment_starting_mid_gop():
+    buf = fragment(1, 0, [(512, 10, NON_SYNC), (512, 900, 0)])
+    assert list(mp4_sync_samples(buf, 1, 0)) == []
+
+def test_sync_samples_other_track():
+    assert list(mp4_sync_samples(fragment(2, 0, [(512, 100, 0)]), 1, 0)) == []
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_iframe_playlist_gop_shorter_than_segment(tmp_path):
+    # 2 s GOP, 4 s segments: every entry must start at its fragment and cover one frame
+    src = tmp_path / "in.mp4"
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=160x90:rate=25:duration=12",
+                    "-c:v", "libx264", "-g", "50", "-keyint_min", "50", "-sc_threshold", "0", str(src)], check=True)
+    from previews.streaming import package_hls
+    hls = tmp_path / "hls"
+    package_hls(src, hls, 4.0)
+    n = write_iframe_playlist(hls)
+    lines = (hls / "iframes.m3u8").read_text().splitlines()
+    ranges = [line.split(":")[1] for line in lines if line.startswith("#EXT-X-BYTERANGE:")]
+    segs = [line for line in lines if line.startswith("seg_")]
+    assert n == len(ranges) == len(segs) == len(set(segs))
+    track_id, _, default_flags = mp4_video_track((hls / "init.mp4").read_bytes())
+    for r, seg in zip(ranges, segs):
+        length, off = map(int, r.split("@"))
+        buf = (hls / seg).read_bytes()
+        moofs = [pos for kind, pos, _, _ in mp4_boxes(buf) if kind == b"moof"]
+        assert off in moofs and off + length < len(buf)
+    durations = [float(line[8:].rstrip(",")) for line in lines if line.startswith("#EXTINF:")]
+    assert sum(durations) == pytest.approx(12, abs=0.1)
@@ -0,0 +1,57 @@
+from previews.vtt import (cue_rows, find_cue, hhmmss_ms, parse_ts, read_vtt_tail, uniform_cue_rows,
+                          write_cue_index, write_vtt)
+
+def test_timestamps_round_trip():
+    for t in (0.0, 1.5, 59.999, 3600 + 61.25):
+        assert abs(parse_ts(hhmmss_ms(t)) - t) < 5e-4
+    assert hhmmss_ms(3723.5) == "01:02:03.500"
+
+def test_write_vtt_uniform_cues(tmp_path):
+    vtt = tmp_path / "thumbnails.vtt"
+    rows = uniform_cue_rows(0, 5, 2.0, 9.0, 2, 4, 160, 90, chunk=3)
+    assert write_vtt(vtt, rows, "sprite_%d.webp", 160, 90) == 5
+    assert vtt.read_text().split("\n\n") == [
+        "WEBVTT",
+        "00:00:00.000 --> 00:00:02.000\nsprite_0.webp#xywh=0,0,160,90",
+        "00:00:02.000 --> 00:00:04.000\nsprite_0.webp#xywh=160,0,160,90",
+        "00:00:04.000 --> 00:00:06.000\nsprite_0.webp#xywh=0,90,160,90",
+        "00:00:06.000 --> 00:00:08.000\nsprite_0.webp#xywh=160,90,160,90",
+        "00:00:08.000 --> 00:00:09.000\nsprite_1.webp#xywh=0,0,160,90\n",
+    ]
+    last = read_vtt_tail(vtt, tail=64)
+    assert (last["start"], last["end"], last["url"], last["x"], last["y"]) == (8.0, 9.0, "sprite_1.webp", 0, 0)
+    assert vtt.read_bytes()[last["offset"]:].startswith(b"00:00:08.000 -->")
+
+def test_write_vtt_appends_after_truncation(tmp_path):
+    vtt = tmp_path / "thumbnails.vtt"
+    write_vtt(vtt, uniform_cue_rows(0, 3, 2.0, 6.0, 2, 4, 160, 90), "sprite_%d.webp", 160, 90)
+    last = read_vtt_tail(vtt)
+    # Growing recording: the last cue is rewritten with its new end, then more follow
+    write_vtt(vtt, uniform_cue_rows(2, 4, 2.0, 8.0, 2, 4, 160, 90), "sprite_%d.webp", 160, 90, append_at=last["offset"])
+    full = tmp_path / "full.vtt"
+    write_vtt(full, uniform_cue_rows(0, 4, 2.0, 8.0, 2, 4, 160, 90), "sprite_%d.webp", 160, 90)
+    assert vtt.read_bytes() == full.read_bytes()
+
+def test_cue_index_find_cue(tmp_path):
+    idx = tmp_path / "thumbnails.idx"
+    rows = lambda first: cue_rows([0.0, 1.5, 7.25, 30.0][first:], [1.5, 7.25, 30.0, 31.0][first:],
+                                  [0, 1, 2, 3][first:], 2, 2, 160, 90)
+    assert write_cue_index(idx, rows(0), "sprite_%d.jpg", 160, 90) == 4
+    assert find_cue(idx, 0.0) == (0.0, 1.5, "sprite_0.jpg", 0, 0, 160, 90)
+    assert find_cue(idx, 7.0) == (1.5, 7.25, "sprite_0.jpg", 160, 0, 160, 90)
+    assert find_cue(idx, 7.25) == (7.25, 30.0, "sprite_1.jpg", 0, 0, 160, 90)
+    assert find_cue(idx, 99.0) == (30.0, 31.0, "sprite_1.jpg", 160, 0, 160, 90)
+    before = idx.read_bytes()
+    assert write_cue_index(idx, rows(2), "sprite_%d.jpg", 160, 90, first=2) == 4
+    assert idx.read_bytes() == before
+
+def test_cue_index_before_first_cue(tmp_path):
+    idx = tmp_path / "thumbnails.idx"
+    write_cue_index(idx, cue_rows([5.0, 7.0], [7.0, 9.0], [0, 1], 2, 2, 160, 90), "sprite_%d.jpg", 160, 90)
+    assert find_cue(idx, 4.999) is None
+    assert find_cue(idx, 5.0) == (5.0, 7.0, "sprite_0.jpg", 0, 0, 160, 90)
+
+def test_cue_index_empty(tmp_path):
+    idx = tmp_path / "thumbnails.idx"
+    write_cue_index(idx, [], "sprite_%d.jpg", 160, 90)
+    assert find_cue(idx, 1.0) is None